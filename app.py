@@ -1,9 +1,12 @@
 import streamlit as st
 import random
-from typing import List, Dict, Any
-from models.xiangqi import XiangqiBoard, ChessPiece, Color, PieceType, DivinationResult, WuXing
-from divination_engine import perform_divination
-from urllib.parse import urlencode
+from typing import List, Dict, Any, Optional
+from models.xiangqi import XiangqiBoard, ChessPiece, Color, DivinationResult, WuXing, spread_code
+from board_codec import GameState, encode_board_token
+from board_render import BOARD_CSS, BOARD_JS, PAGE_STYLE, render_board_html
+from metrics import stage
+from prewarm import start_prewarm
+# 解卦引擎、預計算表與紀錄儲存於背景預熱，需要時才匯入（見 prewarm.py）
 
 # --- CONFIG & SETUP ---
 st.set_page_config(
@@ -14,28 +17,76 @@ st.set_page_config(
 )
 
 # --- STATE ENCODING & DECODING ---
-PIECE_TYPE_TO_CODE = {p: p.name[0] for p in PieceType}
-CODE_TO_PIECE_TYPE = {v: k for k, v in PIECE_TYPE_TO_CODE.items()}
-COLOR_TO_CODE = {Color.RED: 'R', Color.BLACK: 'B'}
-CODE_TO_COLOR = {v: k for k, v in COLOR_TO_CODE.items()}
-PIECE_DEFINITIONS_MAP = {(p_type, color): (points, wu_xing) for p_type, color, points, wu_xing in XiangqiBoard.PIECE_DEFINITIONS}
-
-def encode_board(pieces: List[ChessPiece]) -> str:
-    codes = [COLOR_TO_CODE[p.color] + PIECE_TYPE_TO_CODE[p.piece_type] for p in pieces]
-    return ",".join(codes)
-
-def decode_board(board_str: str) -> List[ChessPiece]:
-    pieces = []
-    codes = board_str.split(',')
-    for code in codes:
-        if len(code) == 2:
-            color = CODE_TO_COLOR.get(code[0])
-            p_type = CODE_TO_PIECE_TYPE.get(code[1])
-            if color and p_type:
-                points, wu_xing = PIECE_DEFINITIONS_MAP.get((p_type, color), (0, None))
-                if wu_xing:
-                    pieces.append(ChessPiece(p_type, color, points, wu_xing))
-    return pieces
+def read_game_state(params) -> Optional[GameState]:
+    """從URL讀取整局狀態；支援舊版 b/r/s 參數"""
+    token = params.get("g")
+    if token:
+        try:
+            return GameState.decode(token)
+        except ValueError:
+            return None
+    board_str = params.get("b")
+    if board_str:
+        return GameState.from_legacy(board_str, params.get_all("r"), params.get_all("s"),
+                                     params.get("div") == "1")
+    return None
+
+# 工作階段中的目前狀態；點擊只更新此狀態並同步URL，不重新載入頁面
+STATE_KEY = "game_state"
+# 本工作階段上次整頁執行時是否顯示卜卦結果
+RESULT_SHOWN_KEY = "result_shown"
+# 棋盤元件的 key；最近一次點擊為其狀態 click = {cell: 位置, seq: 序號}
+BOARD_KEY = "xq_board"
+
+def load_game_state() -> GameState:
+    """取得目前狀態：URL與工作階段狀態一致時沿用工作階段狀態，否則（重新載入、分享連結）以URL為準"""
+    params = st.query_params
+    state = st.session_state.get(STATE_KEY)
+    if state is not None and params.get("g") == state.encode():
+        return state
+    state = read_game_state(params)
+    if state is None:
+        state = GameState.from_pieces(XiangqiBoard().pieces)
+    # 新局或舊版連結：改寫為單一狀態參數
+    set_game_state(state)
+    return state
+
+def set_game_state(state: GameState):
+    """更新工作階段狀態並同步URL（僅改寫網址，不觸發頁面導覽）"""
+    st.session_state[STATE_KEY] = state
+    token = state.encode()
+    if st.query_params.get("g") != token or len(st.query_params) != 1:
+        st.query_params.from_dict({"g": token})
+
+# --- CALLBACKS ---
+def on_board_click():
+    click = st.session_state[BOARD_KEY].click
+    index = click.get('cell') if isinstance(click, dict) else None
+    if isinstance(index, int) and 0 <= index < len(st.session_state[STATE_KEY].board):
+        set_game_state(st.session_state[STATE_KEY].click(index))
+
+def on_new_board():
+    set_game_state(GameState.from_pieces(XiangqiBoard().pieces))
+
+def on_clear():
+    set_game_state(st.session_state[STATE_KEY].cleared())
+
+def on_divination():
+    state = st.session_state[STATE_KEY]
+    save_reading(encode_board_token(list(state.board)), state.selected_pieces)
+    set_game_state(state.with_divination())
+
+@st.cache_resource
+def prewarm_process():
+    """每個伺服器程序只啟動一次背景預熱"""
+    return start_prewarm()
+
+def save_reading(board_token: str, pieces: List[ChessPiece]):
+    """將卜卦結果加入紀錄寫入佇列（背景批次寫入，不阻塞畫面）"""
+    from divination_cache import cached_divination
+    from reading_store import get_reading_store
+    result = cached_divination(pieces)
+    get_reading_store().record(board_token, spread_code(pieces), result.pattern_mask, result.balance_score)
 
 # --- UI RENDERING ---
 def render_gua_piece(position_name: str, position_number: int, selected_positions: Dict[str, Any]):
@@ -58,61 +109,92 @@ def render_analysis_sections(result: DivinationResult):
             with st.expander(title, expanded=True):
                 st.write(content)
 
-st.markdown("""
-<style>
-.chess-piece, .gua-number {
-    width: 60px; height: 60px; border-radius: 50%; display: flex; align-items: center;
-    justify-content: center; font-weight: bold; font-size: 16px; margin: 5px auto;
-    border: 2px solid #888; transition: all 0.3s ease; cursor: pointer;
-}
-.chess-piece-red { background-color: #dc3545 !important; color: white !important; }
-.chess-piece-black { background-color: #343a40 !important; color: white !important; }
-.gua-number { border: 2px solid #333; background-color: white; }
-</style>
-""", unsafe_allow_html=True)
-
-def main():
-    # --- 1. 狀態管理：從URL讀取或初始化 ---
-    params = st.query_params
-    board_str = params.get("b")
-
-    if not board_str:
-        initial_board = XiangqiBoard()
-        st.query_params["b"] = encode_board(initial_board.pieces)
-        st.rerun()
-
-    board_pieces = decode_board(board_str)
-    revealed_indices = {int(i) for i in params.get_all("r") if i.isdigit()}
-    selected_indices = [int(i) for i in params.get_all("s") if i.isdigit()]
-    show_divination = params.get("div") == "1"
+def render_result(result: DivinationResult):
+    with stage("app.result_render"):
+        st.divider()
+        st.subheader("🔮 卜卦結果")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("陰陽平衡", "平衡" if result.yin_yang_balance else "不平衡")
+        with col2:
+            st.metric("平衡分數", f"{result.balance_score}/100")
+        with col3:
+            red_count = sum(1 for p in result.selected_pieces if p.color == Color.RED)
+            st.metric("紅黑比例", f"{red_count}:{5-red_count}")
+        if result.patterns:
+            st.subheader("📊 格局分析")
+            for pattern in result.patterns:
+                st.success(f"✨ {pattern}")
+        if result.missing_talents:
+            st.subheader("⚠️ 三才缺失")
+            for talent in result.missing_talents:
+                st.warning(f"缺少 {talent}")
+        render_analysis_sections(result)
+        if result.suggestions:
+            st.subheader("💡 建議")
+            for i, suggestion in enumerate(result.suggestions, 1):
+                st.info(f"{i}. {suggestion}")
 
-    selected_pieces = [board_pieces[i] for i in selected_indices]
+def what_if_rows(report, alternatives) -> List[Dict[str, str]]:
+    from pattern_rules import decode_patterns
+    rows = []
+    for alternative in alternatives:
+        score_change = alternative.balance_score - report.balance_score
+        rows.append({
+            "替換為": alternative.piece.display_name,
+            "平衡分數": f"{alternative.balance_score}" + (f" ({score_change:+d})" if score_change else ""),
+            "新增格局": "、".join(decode_patterns(alternative.patterns & ~report.patterns)),
+            "失去格局": "、".join(decode_patterns(report.patterns & ~alternative.patterns)),
+            "互動變化": "；".join(text for _, text in alternative.interactions),
+        })
+    return rows
+
+def render_what_if(result: DivinationResult):
+    """各位置換成其他棋子時，格局、平衡與互動關係的變化"""
+    with stage("app.what_if_render"):
+        from divination_whatif import SLOT_LABELS, what_if
+        report = what_if(result.selected_pieces)
+        st.subheader("🔄 假設分析")
+        st.caption("若某個位置換成其他棋子，格局與平衡會如何改變")
+        tabs = st.tabs([f"{label}（{piece.display_name}）"
+                        for label, piece in zip(SLOT_LABELS, result.selected_pieces)])
+        for tab, alternatives in zip(tabs, report.alternatives):
+            with tab:
+                st.dataframe(what_if_rows(report, alternatives), hide_index=True, width="stretch")
+
+st.markdown(PAGE_STYLE, unsafe_allow_html=True)
+
+# 棋盤元件（同一定義重複註冊不會產生新元件）
+board_component = st.components.v2.component("xq_board", css=BOARD_CSS, js=BOARD_JS)
+
+def render_board(state: GameState):
+    """棋盤：單一元件，點擊時回傳位置並以回呼更新工作階段狀態"""
+    board_component(data=render_board_html(state), key=BOARD_KEY, on_click_change=on_board_click)
+
+@st.fragment
+def render_play_area():
+    """控制按鈕、棋盤與卦象；點擊只重新執行此區塊"""
+    state = st.session_state[STATE_KEY]
+    if state.show_divination != st.session_state.get(RESULT_SHOWN_KEY):
+        # 卜卦結果需要顯示或隱藏時才重新執行整頁
+        st.rerun(scope="app")
+
+    selected_pieces = state.selected_pieces
     selected_positions = {}
     position_order = ['center', 'left', 'right', 'top', 'bottom']
     for i, piece in enumerate(selected_pieces):
         selected_positions[position_order[i]] = piece
 
-    # --- 2. UI 渲染 ---
-    st.title("♟️ 象棋卜卦")
-    st.markdown("點擊象棋翻面並選擇，探索您的運勢")
-    st.markdown("---")
-
     # 控制按鈕
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        if st.button("🎲 重新生成棋盤", type="primary"):
-            st.query_params.clear()
-            st.rerun()
+        st.button("🎲 重新生成棋盤", type="primary", on_click=on_new_board)
     with col2:
-        if st.button("🧹 清除選擇"):
-            st.query_params.from_dict({"b": board_str})
-            st.rerun()
+        st.button("🧹 清除選擇", on_click=on_clear)
     with col3:
-        if st.button("🔮 開始卜卦", disabled=len(selected_indices) != 5):
-            st.query_params["div"] = "1"
-            st.rerun()
+        st.button("🔮 開始卜卦", disabled=len(selected_pieces) != 5, on_click=on_divination)
     with col4:
-        st.metric("已選擇", f"{len(selected_indices)}/5")
+        st.metric("已選擇", f"{len(selected_pieces)}/5")
     
     st.markdown("---")
     
@@ -121,44 +203,10 @@ def main():
     with col_board:
         st.subheader("棋盤")
         st.markdown("點擊象棋翻面並選擇（最多5個）")
-        for row in range(4):
-            cols = st.columns(8)
-            for col in range(8):
-                with cols[col]:
-                    index = row * 8 + col
-                    piece = board_pieces[index]
-                    is_revealed = index in revealed_indices
-                    is_selected = index in selected_indices
-
-                    new_revealed = revealed_indices.union({index})
-                    new_selected = selected_indices.copy()
-                    if is_selected:
-                        new_selected.remove(index)
-                    elif len(new_selected) < 5:
-                        new_selected.append(index)
-                    
-                    query_dict = [("b", board_str)] + \
-                                 [("r", r_idx) for r_idx in sorted(list(new_revealed))] + \
-                                 [("s", s_idx) for s_idx in new_selected]
-                    href = f"?{urlencode(query_dict)}"
-
-                    style = (
-                        "width:60px; height:60px; display:flex; align-items:center; "
-                        "justify-content:center; font-weight:bold; text-decoration:none; "
-                        "border-radius:50%; margin: 5px auto; transition: all 0.2s ease;"
-                    )
-                    if is_revealed:
-                        style += "background-color:#dc3545; color:white;" if piece.color == Color.RED else "background-color:#343a40; color:white;"
-                    else:
-                        style += "background-color:#F5F5DC; color:#F5F5DC;"
-                    if is_selected:
-                        style += "border: 4px solid #ffc107; box-shadow: 0 0 10px #ffc107;"
-                    else:
-                        style += "border: 4px solid #888;"
-                    label = piece.display_name if is_revealed else "&nbsp;"
-                    st.markdown(f'<a href="{href}" style="{style}" target="_self">{label}</a>', unsafe_allow_html=True)
-
-    with col_gua:
+        with stage("app.board_render"):
+            render_board(state)
+
+    with col_gua, stage("app.gua_render"):
         _, center_col, _ = st.columns([0.5, 2, 0.5])
         with center_col:
             st.subheader("卦象")
@@ -176,32 +224,29 @@ def main():
             with col_bottom:
                 render_gua_piece('bottom', 5, selected_positions)
 
+def main():
+    prewarm_process()
+
+    # --- 1. 狀態管理：從工作階段或URL讀取 ---
+    with stage("app.state_decode"):
+        state = load_game_state()
+    show_divination = state.show_divination and len(state.selected) == 5
+    st.session_state[RESULT_SHOWN_KEY] = state.show_divination
+
+    # --- 2. UI 渲染 ---
+    st.title("♟️ 象棋卜卦")
+    st.markdown("點擊象棋翻面並選擇，探索您的運勢")
+    st.markdown("---")
+    render_play_area()
+
     # --- 3. 卜卦結果渲染 ---
-    if show_divination and len(selected_pieces) == 5:
-        result = perform_divination(selected_pieces)
-        st.divider()
-        st.subheader("🔮 卜卦結果")
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.metric("陰陽平衡", "平衡" if result.yin_yang_balance else "不平衡")
-        with col2:
-            st.metric("平衡分數", f"{result.balance_score}/100")
-        with col3:
-            red_count = sum(1 for p in result.selected_pieces if p.color == Color.RED)
-            st.metric("紅黑比例", f"{red_count}:{5-red_count}")
-        if result.patterns:
-            st.subheader("📊 格局分析")
-            for pattern in result.patterns:
-                st.success(f"✨ {pattern}")
-        if result.missing_talents:
-            st.subheader("⚠️ 三才缺失")
-            for talent in result.missing_talents:
-                st.warning(f"缺少 {talent}")
-        render_analysis_sections(result)
-        if result.suggestions:
-            st.subheader("💡 建議")
-            for i, suggestion in enumerate(result.suggestions, 1):
-                st.info(f"{i}. {suggestion}")
+    if show_divination:
+        with stage("app.divination"):
+            from divination_cache import cached_divination
+            # 快取只存放精簡結果，完整文字只在本次渲染期間存在
+            result = cached_divination(state.selected_pieces).expand()
+        render_result(result)
+        render_what_if(result)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,344 @@
+"""
+併發負載測試
+在本機以無頭模式啟動伺服器（serve.py，與部署相同：伺服器啟動時即開始預熱），透過 websocket（與瀏覽器相同的協定）模擬多位使用者
+走完實際流程：新棋盤 → 翻開並選擇5隻 → 開始卜卦 → 清除選擇；
+依併發數回報每次重新執行的延遲百分位數、吞吐量、每個工作階段的記憶體與每次點擊的 CPU 時間。
+伺服器的 CPU 與記憶體由 /proc 讀取（僅限 Linux，其他平台不回報）
+
+用法：
+    python -m benchmarks.load --users 1,4,16 --iterations 3 -o load.json
+    python -m benchmarks.load --baseline load.json [--threshold 0.2] [--fail-on-regression]
+    python -m benchmarks.load --url ws://127.0.0.1:8501    # 對已啟動的伺服器（不回報伺服器資源）
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from websockets.asyncio.client import connect
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from benchmarks.run import compare, environment, format_seconds
+from models.xiangqi import SPREAD_SIZE
+from board_codec import BOARD_SIZE
+
+USERS = (1, 4, 16)
+ITERATIONS = 3
+THRESHOLD = 0.20          # 比較基準時，中位數變慢超過此比例視為退步（併發測試的變異較大）
+STARTUP_TIMEOUT = 60.0
+RERUN_TIMEOUT = 60.0
+PERCENTILES = (50, 90, 95, 99)
+
+# 控制按鈕的文字（見 app.render_play_area）
+NEW_BOARD_LABEL = "🎲 重新生成棋盤"
+CLEAR_LABEL = "🧹 清除選擇"
+DIVINATION_LABEL = "🔮 開始卜卦"
+
+_FINISHED = ForwardMsg.ScriptFinishedStatus
+
+# --- 伺服器 ---
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_server(port: int, env: Dict[str, str]) -> subprocess.Popen:
+    """以無頭模式啟動 serve.py，等待健康檢查通過"""
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BASE_DIR, 'serve.py'),
+         '--server.headless', 'true', '--server.port', str(port), '--server.address', '127.0.0.1',
+         '--server.fileWatcherType', 'none', '--browser.gatherUsageStats', 'false'],
+        cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"伺服器啟動失敗：{process.stderr.read().decode(errors='replace')}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as response:
+                if response.status == 200:
+                    return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("伺服器啟動逾時")
+
+class ProcessStats:
+    """由 /proc 讀取程序的 CPU 時間與常駐記憶體"""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.available = os.path.exists(f"/proc/{pid}/stat")
+        self._ticks = os.sysconf('SC_CLK_TCK') if self.available else 1
+
+    def cpu_seconds(self) -> Optional[float]:
+        if not self.available:
+            return None
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / self._ticks  # utime + stime
+
+    def rss_bytes(self) -> Optional[int]:
+        if not self.available:
+            return None
+        with open(f"/proc/{self.pid}/status") as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+        return None
+
+# --- 模擬使用者 ---
+@dataclass
+class Session:
+    """單一瀏覽器工作階段：追蹤網址參數、畫面上的按鈕與棋盤元件"""
+    websocket: Any
+    query_string: str = ""
+    board: Optional[Tuple[str, str]] = None                             # 棋盤元件的 (元件ID, fragment ID)
+    clicks: int = 0                                                     # 棋盤點擊序號
+    controls: Dict[str, Tuple[str, str]] = field(default_factory=dict)  # 按鈕文字 -> (元件ID, fragment ID)
+
+    async def rerun(self, widget: Optional[Tuple[str, str]] = None, cell: Optional[int] = None) -> float:
+        """送出重新執行請求（可附帶按鈕點擊，或 cell 指定點擊棋盤的位置），等待執行完成並回傳延遲秒數"""
+        message = BackMsg()
+        client_state = message.rerun_script
+        client_state.query_string = self.query_string
+        if cell is not None:
+            # 與瀏覽器相同：將 {cell, seq} 寫入棋盤元件的狀態 click
+            component_id, fragment_id = self.board
+            self.clicks += 1
+            state = client_state.widget_states.widgets.add()
+            state.id = component_id
+            state.json_value = json.dumps({'click': {'cell': cell, 'seq': self.clicks}})
+            client_state.fragment_id = fragment_id
+        elif widget is not None:
+            widget_id, fragment_id = widget
+            state = client_state.widget_states.widgets.add()
+            state.id = widget_id
+            state.trigger_value = True
+            client_state.fragment_id = fragment_id
+        started = time.perf_counter()
+        await self.websocket.send(message.SerializeToString())
+        while True:
+            data = await asyncio.wait_for(self.websocket.recv(), RERUN_TIMEOUT)
+            forward = ForwardMsg()
+            forward.ParseFromString(data)
+            kind = forward.WhichOneof('type')
+            if kind == 'delta':
+                self._track(forward.delta)
+            elif kind == 'page_info_changed':
+                self.query_string = forward.page_info_changed.query_string
+            elif kind == 'script_finished':
+                status = forward.script_finished
+                if status == _FINISHED.FINISHED_WITH_COMPILE_ERROR:
+                    raise RuntimeError("app.py 編譯失敗")
+                if status != _FINISHED.FINISHED_EARLY_FOR_RERUN:
+                    return time.perf_counter() - started
+
+    def _track(self, delta):
+        if delta.WhichOneof('type') != 'new_element':
+            return
+        element_type = delta.new_element.WhichOneof('type')
+        if element_type == 'bidi_component':
+            self.board = (delta.new_element.bidi_component.id, delta.fragment_id)
+        elif element_type == 'button':
+            button = delta.new_element.button
+            self.controls[button.label] = (button.id, delta.fragment_id)
+
+@dataclass
+class LevelResult:
+    """單一併發數的測試結果"""
+    users: int
+    wall: float
+    latencies: Dict[str, List[float]]
+    cpu_seconds: Optional[float] = None
+    rss_per_session: Optional[float] = None
+
+    @property
+    def reruns(self) -> int:
+        return sum(len(values) for values in self.latencies.values())
+
+    def to_dict(self) -> Dict[str, Any]:
+        reruns = self.reruns
+        all_latencies = [value for values in self.latencies.values() for value in values]
+        return {
+            'users': self.users,
+            'reruns': reruns,
+            'wall': self.wall,
+            'throughput': reruns / self.wall if self.wall else 0.0,
+            'cpu_per_rerun': self.cpu_seconds / reruns if self.cpu_seconds is not None and reruns else None,
+            'cpu_utilization': self.cpu_seconds / self.wall if self.cpu_seconds is not None and self.wall else None,
+            'rss_per_session': self.rss_per_session,
+            'latency': {step: summarize(values) for step, values in
+                        [('all', all_latencies), *sorted(self.latencies.items())]},
+        }
+
+def percentile(ordered: List[float], percent: float) -> float:
+    """最近序位法百分位數（ordered 須已排序）"""
+    index = max(0, min(len(ordered) - 1, -(-len(ordered) * percent // 100) - 1))
+    return ordered[int(index)]
+
+def summarize(values: List[float]) -> Dict[str, Any]:
+    ordered = sorted(values)
+    summary: Dict[str, Any] = {'count': len(ordered)}
+    if ordered:
+        summary['median'] = percentile(ordered, 50)
+        for percent in PERCENTILES[1:]:
+            summary[f"p{percent}"] = percentile(ordered, percent)
+        summary['max'] = ordered[-1]
+    return summary
+
+async def run_user(url: str, rng: random.Random, iterations: int, think: float,
+                   latencies: Dict[str, List[float]], finished: asyncio.Event, done: List[int], users: int,
+                   memory_ready: asyncio.Event):
+    """單一使用者：每輪新棋盤、選5隻、卜卦、清除；完成後保持連線直到量測完記憶體"""
+    async with connect(f"{url}/_stcore/stream", subprotocols=["streamlit"], max_size=None) as websocket:
+        session = Session(websocket)
+
+        async def step(name: str, widget: Optional[Tuple[str, str]] = None, cell: Optional[int] = None):
+            latencies[name].append(await session.rerun(widget, cell))
+            if think:
+                await asyncio.sleep(think)
+
+        await step('load')
+        for iteration in range(iterations):
+            if iteration:
+                await step('new_board', session.controls[NEW_BOARD_LABEL])
+            for index in rng.sample(range(BOARD_SIZE), SPREAD_SIZE):
+                await step('click', cell=index)
+            await step('divination', session.controls[DIVINATION_LABEL])
+            await step('clear', session.controls[CLEAR_LABEL])
+
+        done.append(1)
+        if len(done) == users:
+            finished.set()
+        await memory_ready.wait()
+
+async def run_level(url: str, users: int, iterations: int, seed: int, think: float,
+                    stats: Optional[ProcessStats]) -> LevelResult:
+    """以指定併發數執行一輪測試"""
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    finished = asyncio.Event()
+    memory_ready = asyncio.Event()
+    done: List[int] = []
+    rss_before = stats.rss_bytes() if stats else None
+    cpu_before = stats.cpu_seconds() if stats else None
+
+    started = time.perf_counter()
+    tasks = [asyncio.ensure_future(run_user(url, random.Random(seed * 1_000_003 + user), iterations, think,
+                                            latencies, finished, done, users, memory_ready))
+             for user in range(users)]
+    finished_wait = asyncio.ensure_future(finished.wait())
+    await asyncio.wait([finished_wait, *tasks], return_when=asyncio.FIRST_COMPLETED)
+    for task in tasks:
+        if task.done() and task.exception():
+            memory_ready.set()
+            raise task.exception()
+    await finished_wait
+    wall = time.perf_counter() - started
+
+    result = LevelResult(users, wall, dict(latencies))
+    if stats and stats.available:
+        result.cpu_seconds = stats.cpu_seconds() - cpu_before
+        # 所有工作階段仍保持連線時量測，平均分攤到每個工作階段（約略值）
+        result.rss_per_session = max(0, stats.rss_bytes() - rss_before) / users
+    memory_ready.set()
+    await asyncio.gather(*tasks)
+    return result
+
+def format_bytes(value: Optional[float]) -> str:
+    if value is None:
+        return "n/a"
+    return f"{value / 1024:.0f} KiB"
+
+def flatten(levels: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """整理為 名稱 -> 統計 的形式，與 benchmarks.run 的比較格式相同"""
+    results = {}
+    for level in levels:
+        for step, summary in level['latency'].items():
+            if summary['count']:
+                results[f"load.u{level['users']}.{step}"] = summary
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="併發負載測試")
+    parser.add_argument('--users', default=",".join(map(str, USERS)), help="併發使用者數（逗號分隔，依序測試）")
+    parser.add_argument('--iterations', type=int, default=ITERATIONS, help="每位使用者完成的流程次數")
+    parser.add_argument('--think', type=float, default=0.0, help="每次點擊之間的等待秒數")
+    parser.add_argument('--seed', type=int, default=20240501, help="選擇棋盤格的亂數種子")
+    parser.add_argument('--url', help="對已啟動的伺服器測試，例如 ws://127.0.0.1:8501")
+    parser.add_argument('-o', '--output', help="將結果寫入 JSON 檔")
+    parser.add_argument('--baseline', help="與先前儲存的 JSON 結果比較")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help="視為退步的變慢比例")
+    parser.add_argument('--fail-on-regression', action='store_true', help="有退步時以狀態碼1結束")
+    args = parser.parse_args()
+    user_levels = [int(value) for value in args.users.split(',') if value.strip()]
+
+    process = None
+    stats = None
+    url = args.url.rstrip('/') if args.url else None
+    with tempfile.TemporaryDirectory() as temporary:
+        if url is None:
+            # 卜卦紀錄寫入暫存資料庫，不影響正式的 readings.db
+            env = dict(os.environ, XIANGQI_READINGS_DB=os.path.join(temporary, 'readings.db'))
+            port = free_port()
+            process = start_server(port, env)
+            stats = ProcessStats(process.pid)
+            url = f"ws://127.0.0.1:{port}"
+        try:
+            # 預熱：第一個工作階段會觸發模組載入與背景預熱，不列入結果
+            asyncio.run(run_level(url, 1, 1, args.seed, 0.0, None))
+            levels = []
+            for users in user_levels:
+                level = asyncio.run(run_level(url, users, args.iterations, args.seed, args.think, stats)).to_dict()
+                levels.append(level)
+                overall = level['latency']['all']
+                print(f"users={users:<4d} reruns={level['reruns']:<6d} {level['throughput']:8.1f}/s  "
+                      f"p50 {format_seconds(overall['median'])}  p95 {format_seconds(overall['p95'])}  "
+                      f"p99 {format_seconds(overall['p99'])}  "
+                      f"cpu/rerun {format_seconds(level['cpu_per_rerun']) if level['cpu_per_rerun'] else 'n/a'}  "
+                      f"rss/session {format_bytes(level['rss_per_session'])}", file=sys.stderr)
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=30)
+
+    results = flatten(levels)
+    report: Dict[str, Any] = {'environment': environment(), 'levels': levels, 'results': results}
+    regressions: List[str] = []
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        report['baseline'] = baseline.get('environment')
+        report['comparison'] = comparison = compare(results, baseline.get('results', {}), args.threshold)
+        for name, item in comparison.items():
+            print(f"{name:40s} x{item['ratio']:.2f} {item['status']}", file=sys.stderr)
+        regressions = [name for name, item in comparison.items() if item['status'] == 'regression']
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""
+效能基準測試
+以固定亂數種子產生輸入，對解卦引擎各階段、棋盤產生、編碼與渲染，以及 app.main 的無頭執行計時；
+結果輸出為 JSON，並可與先前儲存的基準結果比較
+
+用法：
+    python -m benchmarks.run -o bench.json
+    python -m benchmarks.run --baseline bench.json [--threshold 0.1] [--fail-on-regression]
+    python -m benchmarks.run --filter engine.
+"""
+
+import argparse
+import atexit
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from dataclasses import dataclass, replace
+from functools import cached_property
+from typing import Any, Callable, Dict, List
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from models.xiangqi import ChessPiece, KIND_COUNTS, SPREAD_SIZE, XiangqiBoard, piece_for_kind
+from board_codec import GameState, decode_board, encode_board
+from board_generator import generate_boards
+from board_render import render_board_html
+import divination_engine as engine
+from divination_compact import compact_result
+from divination_table import get_outcome_table
+from spread_features import features_for_code
+
+SEED = 20240501
+SPREAD_COUNT = 256     # 每次呼叫處理的卦象數
+BOARD_BATCH = 65_536   # 向量化產生器每次呼叫的棋盤數
+REPEAT = 7
+THRESHOLD = 0.10       # 比較基準時，中位數變慢超過此比例視為退步
+
+@dataclass
+class Benchmark:
+    """單一基準測試：setup() 準備輸入並回傳計時的函式，該函式每次呼叫執行 ops 次操作
+
+    setup 只在測試被選中時才執行（--filter 未選中的測試不產生任何輸入）
+    """
+    name: str
+    setup: Callable[[], Callable[[], Any]]
+    ops: int = 1
+    repeat: int = REPEAT
+    calibrate: bool = True  # False 時每次重複只呼叫一次（用於較慢的測試）
+
+def sample_spreads(rng: random.Random, count: int) -> List[List[ChessPiece]]:
+    """依實際洗牌方式抽出固定的卦象樣本"""
+    deck = [piece_for_kind(kind) for kind, total in enumerate(KIND_COUNTS) for _ in range(total)]
+    return [rng.sample(deck, SPREAD_SIZE) for _ in range(count)]
+
+def each(func: Callable[[List[ChessPiece]], Any], spreads: List[List[ChessPiece]]) -> Callable[[], None]:
+    def run():
+        for pieces in spreads:
+            func(pieces)
+    return run
+
+def each_cold(func: Callable[[List[ChessPiece]], Any], spreads: List[List[ChessPiece]]) -> Callable[[], None]:
+    """同 each，但每次呼叫前清空特徵快取：引擎函式皆經由 features_for_code，
+    重複計時同一批卦象時快取必定命中，只會量到查表的成本"""
+    def run():
+        features_for_code.cache_clear()
+        for pieces in spreads:
+            func(pieces)
+    return run
+
+class Inputs:
+    """各測試共用的固定輸入（第一次使用時才產生）"""
+
+    @cached_property
+    def spreads(self) -> List[List[ChessPiece]]:
+        return sample_spreads(random.Random(SEED), SPREAD_COUNT)
+
+    @cached_property
+    def boards(self) -> List[XiangqiBoard]:
+        rng = random.Random(SEED + 1)
+        boards = []
+        for _ in range(SPREAD_COUNT):
+            random.seed(rng.random())
+            boards.append(XiangqiBoard())
+        return boards
+
+    @cached_property
+    def states(self) -> List[GameState]:
+        return [GameState(tuple(piece.kind for piece in board.pieces), frozenset(range(0, 32, 3)), (1, 4, 7))
+                for board in self.boards]
+
+    @cached_property
+    def tokens(self) -> List[str]:
+        return [state.encode() for state in self.states]
+
+def build_benchmarks() -> List[Benchmark]:
+    inputs = Inputs()
+
+    def engine_case(name: str) -> Benchmark:
+        func = getattr(engine, name)
+        return Benchmark(f'engine.{name}', lambda: each_cold(func, inputs.spreads), SPREAD_COUNT)
+
+    def suggestions():
+        spreads = inputs.spreads
+        patterns = [engine.identify_patterns(pieces) for pieces in spreads]
+        balances = [engine.perform_divination_reference(pieces).yin_yang_balance for pieces in spreads]
+
+        def run():
+            features_for_code.cache_clear()
+            for pieces, pattern, balance in zip(spreads, patterns, balances):
+                engine.generate_suggestions(pieces, pattern, balance)
+        return run
+
+    def new_boards():
+        def run():
+            for _ in range(SPREAD_COUNT):
+                XiangqiBoard()
+        return run
+
+    benchmarks = [
+        engine_case('perform_divination'),
+        engine_case('perform_divination_reference'),
+        engine_case('check_missing_talents'),
+        engine_case('identify_patterns'),
+        engine_case('analyze_state'),
+        engine_case('analyze_interaction'),
+        engine_case('analyze_give_and_take'),
+        engine_case('analyze_health'),
+        Benchmark('engine.generate_suggestions', suggestions, SPREAD_COUNT),
+        Benchmark('compact.compact_result',
+                  lambda: each(compact_result, [engine.perform_divination(pieces) for pieces in inputs.spreads]),
+                  SPREAD_COUNT),
+        # 每次呼叫都使用新的精簡結果，避免量到實例內已組合好的文字
+        Benchmark('compact.expand',
+                  lambda: each(lambda result: replace(result).expand(),
+                               [compact_result(engine.perform_divination(pieces)) for pieces in inputs.spreads]),
+                  SPREAD_COUNT),
+        Benchmark('board.new', new_boards, SPREAD_COUNT),
+        Benchmark('board.generate_boards', lambda: lambda: generate_boards(BOARD_BATCH, SEED), BOARD_BATCH),
+        Benchmark('codec.encode_board', lambda: each(encode_board, [board.pieces for board in inputs.boards]),
+                  SPREAD_COUNT),
+        Benchmark('codec.decode_board', lambda: each(decode_board, [encode_board(board.pieces) for board in inputs.boards]),
+                  SPREAD_COUNT),
+        Benchmark('codec.state_encode', lambda: each(GameState.encode, inputs.states), SPREAD_COUNT),
+        Benchmark('codec.state_decode', lambda: each(GameState.decode, inputs.tokens), SPREAD_COUNT),
+        Benchmark('render.board_html', lambda: each(render_board_html, inputs.states), SPREAD_COUNT),
+        Benchmark('app.main', lambda: app_runner(inputs.tokens[0]), repeat=5, calibrate=False),
+    ]
+    return benchmarks
+
+def app_runner(token: str) -> Callable[[], None]:
+    """以 Streamlit AppTest 無頭執行 app.py（已選5隻並顯示卜卦結果）
+
+    app.py 會在背景預熱時開啟紀錄儲存；reading_store 於匯入時讀取 XIANGQI_READINGS_DB，
+    此處先改指向暫存目錄，避免在專案目錄建立 readings.db（程序結束時刪除）
+    """
+    from streamlit.testing.v1 import AppTest
+
+    if 'reading_store' not in sys.modules:
+        directory = tempfile.mkdtemp(prefix='xiangqi-bench-')
+        # 紀錄儲存於較晚登記的 atexit 寫入剩餘紀錄，會先於此處的刪除執行
+        atexit.register(shutil.rmtree, directory, True)
+        os.environ['XIANGQI_READINGS_DB'] = os.path.join(directory, 'readings.db')
+
+    state = GameState.decode(token)
+    state = GameState(state.board, frozenset(range(SPREAD_SIZE)), tuple(range(SPREAD_SIZE)), True)
+
+    def run():
+        app = AppTest.from_file(os.path.join(BASE_DIR, 'app.py'), default_timeout=60)
+        app.query_params['g'] = state.encode()
+        app.run()
+        if app.exception:
+            raise RuntimeError(app.exception[0].message)
+    return run
+
+def measure(benchmark: Benchmark) -> Dict[str, Any]:
+    """計時：先決定每次重複的呼叫次數，再重複 repeat 次；回傳每次操作的秒數統計"""
+    func = benchmark.setup()
+    timer = timeit.Timer(func)
+    func()  # 預熱（載入預計算表與各模組）
+    # autorange：呼叫次數依 1、2、5、10… 遞增，直到總時間至少 0.2 秒
+    number = timer.autorange()[0] if benchmark.calibrate else 1
+    gc.collect()
+    timings = [elapsed / (number * benchmark.ops) for elapsed in timer.repeat(benchmark.repeat, number)]
+    return {
+        'ops': benchmark.ops * number,
+        'repeat': benchmark.repeat,
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.fmean(timings),
+        'stdev': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+    }
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'outcome_table': get_outcome_table() is not None,
+        'seed': SEED,
+    }
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+            threshold: float = THRESHOLD) -> Dict[str, Dict[str, Any]]:
+    """以中位數比較目前與基準結果；ratio > 1 表示變慢"""
+    comparison = {}
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        ratio = current['median'] / previous['median']
+        comparison[name] = {
+            'baseline_median': previous['median'],
+            'median': current['median'],
+            'ratio': ratio,
+            'status': 'regression' if ratio > 1 + threshold else 'improvement' if ratio < 1 - threshold else 'same',
+        }
+    return comparison
+
+def format_seconds(value: float) -> str:
+    if value >= 1e-3:
+        return f"{value * 1e3:9.2f} ms"
+    return f"{value * 1e6:9.2f} µs"
+
+def main():
+    parser = argparse.ArgumentParser(description="效能基準測試")
+    parser.add_argument('-o', '--output', help="將結果寫入 JSON 檔")
+    parser.add_argument('--baseline', help="與先前儲存的 JSON 結果比較")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help="視為退步的變慢比例")
+    parser.add_argument('--filter', default='', help="只執行名稱包含此字串的測試")
+    parser.add_argument('--fail-on-regression', action='store_true', help="有退步時以狀態碼1結束")
+    args = parser.parse_args()
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for benchmark in build_benchmarks():
+        if args.filter not in benchmark.name:
+            continue  # 未選中的測試不執行 setup
+        results[benchmark.name] = stats = measure(benchmark)
+        print(f"{benchmark.name:40s} {format_seconds(stats['median'])} ± {format_seconds(stats['stdev']).strip()}",
+              file=sys.stderr)
+
+    report: Dict[str, Any] = {'environment': environment(), 'results': results}
+    regressions: List[str] = []
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        report['baseline'] = baseline.get('environment')
+        report['comparison'] = comparison = compare(results, baseline.get('results', {}), args.threshold)
+        for name, item in comparison.items():
+            print(f"{name:40s} x{item['ratio']:.2f} {item['status']}", file=sys.stderr)
+        regressions = [name for name, item in comparison.items() if item['status'] == 'regression']
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+棋盤狀態編碼
+將整局狀態壓縮為一個 URL 安全的短字串：
+- 棋盤：32隻棋子的多重集合排列序號（94位元，存為12位元組）
+- 翻開的位置：32位元遮罩
+- 已選擇的位置：最多5個索引（各5位元）、數量（3位元）與卜卦旗標（1位元）
+棋盤固定佔前12位元組（16個 base64 字元），同一棋盤的所有狀態共用相同前綴
+
+encode_board/decode_board 為舊版逗號分隔格式的相容讀寫；decode_spread 解析外部傳入的五子卦象
+"""
+
+import base64
+from dataclasses import dataclass, field
+from math import factorial
+from typing import Any, FrozenSet, List, Optional, Tuple
+
+from models.xiangqi import (
+    ChessPiece, Color, PieceType, KIND_COUNTS, KIND_PIECES, SPREAD_SIZE, get_piece, piece_for_kind
+)
+
+BOARD_SIZE = sum(KIND_COUNTS)
+BOARD_BYTES = 12
+STATE_BYTES = 8
+SELECTION_BITS = 5
+
+def _permutation_count(counts: List[int]) -> int:
+    total = factorial(sum(counts))
+    for count in counts:
+        total //= factorial(count)
+    return total
+
+# 所有可能棋盤的數量
+BOARD_PERMUTATIONS = _permutation_count(KIND_COUNTS)
+assert BOARD_PERMUTATIONS < (1 << (BOARD_BYTES * 8))
+
+# --- 舊版格式：顏色代碼 + 類型代碼，以逗號分隔 ---
+PIECE_TYPE_TO_CODE = {p: p.name[0] for p in PieceType}
+CODE_TO_PIECE_TYPE = {v: k for k, v in PIECE_TYPE_TO_CODE.items()}
+COLOR_TO_CODE = {Color.RED: 'R', Color.BLACK: 'B'}
+CODE_TO_COLOR = {v: k for k, v in COLOR_TO_CODE.items()}
+
+def encode_board(pieces: List[ChessPiece]) -> str:
+    codes = [COLOR_TO_CODE[p.color] + PIECE_TYPE_TO_CODE[p.piece_type] for p in pieces]
+    return ",".join(codes)
+
+def decode_board(board_str: str) -> List[ChessPiece]:
+    pieces = []
+    codes = board_str.split(',')
+    for code in codes:
+        if len(code) == 2:
+            color = CODE_TO_COLOR.get(code[0])
+            p_type = CODE_TO_PIECE_TYPE.get(code[1])
+            if color and p_type:
+                pieces.append(get_piece(p_type, color))
+    return pieces
+
+def _resolve_legacy_chariots(pieces: List[ChessPiece]) -> List[ChessPiece]:
+    """舊版代碼 C 同時代表車與包：依出現順序，每方前兩隻視為車，其餘視為包"""
+    chariots_left = {color: KIND_COUNTS[get_piece(PieceType.CHARIOT, color).kind] for color in Color}
+    resolved = []
+    for piece in pieces:
+        if piece.piece_type == PieceType.CANNON and chariots_left[piece.color]:
+            chariots_left[piece.color] -= 1
+            piece = get_piece(PieceType.CHARIOT, piece.color)
+        resolved.append(piece)
+    return resolved
+
+# --- 卦象（五隻棋子）---
+DISPLAY_NAME_TO_PIECE = {piece.display_name: piece for piece in KIND_PIECES}
+PIECE_TYPE_VALUES = {piece_type.value: piece_type for piece_type in PieceType}
+COLOR_VALUES = {color.value: color for color in Color}
+
+def _spread_item(item: Any) -> ChessPiece:
+    if isinstance(item, bool):
+        raise ValueError(f"無法辨識的棋子：{item!r}")
+    if isinstance(item, int):
+        if not 0 <= item < len(KIND_PIECES):
+            raise ValueError(f"種類編碼超出範圍：{item}")
+        return KIND_PIECES[item]
+    if isinstance(item, str):
+        piece = DISPLAY_NAME_TO_PIECE.get(item.strip())
+        if piece is not None:
+            return piece
+    if isinstance(item, dict):
+        type_value, color_value = item.get('type'), item.get('color')
+        # 欄位可能是任意 JSON 值（含不可雜湊的列表、字典），先檢查型別再查表
+        if isinstance(type_value, str) and isinstance(color_value, str):
+            piece_type = PIECE_TYPE_VALUES.get(type_value)
+            color = COLOR_VALUES.get(color_value)
+            if piece_type and color:
+                return get_piece(piece_type, color)
+    raise ValueError(f"無法辨識的棋子：{item!r}")
+
+def decode_spread(value: Any) -> List[ChessPiece]:
+    """解析卦象（依中、左、右、上、下順序的五隻棋子），格式不正確時拋出 ValueError
+
+    接受：種類編碼列表、ChessPiece.to_dict 格式的字典列表、顯示名稱列表，
+    或以逗號分隔的字串（顯示名稱或舊版 encode_board 代碼；代碼 C 的處理同 from_legacy）
+    """
+    if isinstance(value, str):
+        items = [item.strip() for item in value.split(',')]
+        if all(len(item) == 2 and item not in DISPLAY_NAME_TO_PIECE for item in items):
+            pieces = decode_board(value.replace(' ', ''))
+            if len(pieces) != len(items):
+                raise ValueError(f"無法辨識的卦象代碼：{value!r}")
+            pieces = _resolve_legacy_chariots(pieces)
+        else:
+            pieces = [_spread_item(item) for item in items]
+    elif isinstance(value, (list, tuple)):
+        pieces = [_spread_item(item) for item in value]
+    else:
+        raise ValueError("卦象必須是列表或字串")
+
+    if len(pieces) != SPREAD_SIZE:
+        raise ValueError(f"卦象必須剛好有 {SPREAD_SIZE} 隻棋子")
+    used = [0] * len(KIND_COUNTS)
+    for piece in pieces:
+        used[piece.kind] += 1
+        if used[piece.kind] > KIND_COUNTS[piece.kind]:
+            raise ValueError(f"{piece.display_name} 的數量超過整副棋子的上限")
+    return pieces
+
+# --- 排列序號 ---
+def rank_board(kinds: List[int]) -> int:
+    """計算棋盤（32個種類編碼）在所有多重集合排列中的序號"""
+    remaining = list(KIND_COUNTS)
+    if len(kinds) != BOARD_SIZE:
+        raise ValueError(f"棋盤必須有 {BOARD_SIZE} 隻棋子")
+    rank = 0
+    total = BOARD_PERMUTATIONS
+    left = BOARD_SIZE
+    for kind in kinds:
+        if not 0 <= kind < len(remaining) or not remaining[kind]:
+            raise ValueError("棋盤棋子組成不正確")
+        for smaller in range(kind):
+            if remaining[smaller]:
+                rank += total * remaining[smaller] // left
+        total = total * remaining[kind] // left
+        remaining[kind] -= 1
+        left -= 1
+    return rank
+
+def unrank_board(rank: int) -> List[int]:
+    """由排列序號還原棋盤的種類編碼"""
+    if not 0 <= rank < BOARD_PERMUTATIONS:
+        raise ValueError("棋盤序號超出範圍")
+    remaining = list(KIND_COUNTS)
+    kinds = []
+    total = BOARD_PERMUTATIONS
+    left = BOARD_SIZE
+    for _ in range(BOARD_SIZE):
+        for kind, count in enumerate(remaining):
+            if not count:
+                continue
+            block = total * count // left
+            if rank < block:
+                kinds.append(kind)
+                total = block
+                remaining[kind] -= 1
+                left -= 1
+                break
+            rank -= block
+    return kinds
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+def encode_board_token(kinds: List[int]) -> str:
+    """棋盤部分的編碼（固定16字元，可作為同一棋盤所有狀態的共用前綴）"""
+    return _b64encode(rank_board(kinds).to_bytes(BOARD_BYTES, 'big'))
+
+def encode_state_suffix(revealed: FrozenSet[int], selected: Tuple[int, ...], show_divination: bool = False) -> str:
+    """翻牌、選擇與卜卦旗標部分的編碼"""
+    revealed_mask = 0
+    for index in revealed:
+        revealed_mask |= 1 << index
+    return encode_state_bits(revealed_mask, selected, show_divination)
+
+def encode_state_bits(revealed_mask: int, selected: Tuple[int, ...], show_divination: bool = False) -> str:
+    """同 encode_state_suffix，翻開的位置以32位元遮罩傳入"""
+    if len(selected) > SPREAD_SIZE:
+        raise ValueError(f"最多只能選擇 {SPREAD_SIZE} 隻棋子")
+    packed = 0
+    for index in reversed(selected):
+        packed = (packed << SELECTION_BITS) | index
+    packed = (packed << 3) | len(selected)
+    packed = (packed << 1) | int(show_divination)
+    return _b64encode(revealed_mask.to_bytes(4, 'big') + packed.to_bytes(4, 'big'))
+
+@dataclass(frozen=True)
+class GameState:
+    """整局狀態：棋盤、翻開的位置、依序選擇的位置與是否顯示卜卦結果"""
+    board: Tuple[int, ...]
+    revealed: FrozenSet[int] = field(default_factory=frozenset)
+    selected: Tuple[int, ...] = ()
+    show_divination: bool = False
+
+    @classmethod
+    def from_pieces(cls, pieces: List[ChessPiece]) -> 'GameState':
+        """由棋子列表建立新局"""
+        return cls(tuple(piece.kind for piece in pieces))
+
+    @property
+    def pieces(self) -> List[ChessPiece]:
+        """棋盤上的棋子"""
+        return [piece_for_kind(kind) for kind in self.board]
+
+    @property
+    def selected_pieces(self) -> List[ChessPiece]:
+        """依選擇順序的棋子"""
+        return [piece_for_kind(self.board[index]) for index in self.selected]
+
+    def click(self, index: int) -> 'GameState':
+        """點擊棋盤格：翻開該格並切換選擇（已選滿時只翻開），同時隱藏卜卦結果"""
+        if index in self.selected:
+            selected = tuple(i for i in self.selected if i != index)
+        elif len(self.selected) < SPREAD_SIZE:
+            selected = self.selected + (index,)
+        else:
+            selected = self.selected
+        return GameState(self.board, self.revealed | {index}, selected)
+
+    def cleared(self) -> 'GameState':
+        """同一棋盤的新局（全部蓋上、清除選擇）"""
+        return GameState(self.board)
+
+    def with_divination(self) -> 'GameState':
+        """顯示卜卦結果"""
+        return GameState(self.board, self.revealed, self.selected, True)
+
+    def encode(self) -> str:
+        """編碼為 URL 安全字串"""
+        return encode_board_token(list(self.board)) + encode_state_suffix(
+            self.revealed, self.selected, self.show_divination
+        )
+
+    @classmethod
+    def decode(cls, token: str) -> 'GameState':
+        """由編碼字串還原，格式不正確時拋出 ValueError"""
+        try:
+            data = _b64decode(token)
+        except (ValueError, TypeError) as exc:
+            raise ValueError("狀態編碼格式不正確") from exc
+        if len(data) != BOARD_BYTES + STATE_BYTES:
+            raise ValueError("狀態編碼長度不正確")
+
+        board = unrank_board(int.from_bytes(data[:BOARD_BYTES], 'big'))
+        revealed_mask = int.from_bytes(data[BOARD_BYTES:BOARD_BYTES + 4], 'big')
+        packed = int.from_bytes(data[BOARD_BYTES + 4:], 'big')
+        show_divination = bool(packed & 1)
+        packed >>= 1
+        count = packed & 0b111
+        packed >>= 3
+        if count > SPREAD_SIZE:
+            raise ValueError("選擇數量不正確")
+        selected = []
+        for _ in range(count):
+            selected.append(packed & ((1 << SELECTION_BITS) - 1))
+            packed >>= SELECTION_BITS
+        if len(set(selected)) != len(selected):
+            raise ValueError("選擇位置重複")
+
+        revealed = frozenset(index for index in range(BOARD_SIZE) if revealed_mask >> index & 1)
+        return cls(tuple(board), revealed, tuple(selected), show_divination)
+
+    @classmethod
+    def from_legacy(cls, board_str: str, revealed: List[str], selected: List[str],
+                    show_divination: bool = False) -> Optional['GameState']:
+        """由舊版 b/r/s 查詢參數還原，棋盤不完整時回傳 None
+
+        舊版格式中車（CHARIOT）與包（CANNON）同為代碼 C，無法區分；
+        依出現順序，每方前兩隻 C 視為車，其餘視為包
+        """
+        pieces = _resolve_legacy_chariots(decode_board(board_str))
+        board = tuple(piece.kind for piece in pieces)
+        try:
+            rank_board(list(board))
+        except ValueError:
+            return None
+        revealed_set = frozenset(int(i) for i in revealed if i.isdigit() and int(i) < BOARD_SIZE)
+        selected_list = []
+        for i in selected:
+            if i.isdigit() and int(i) < BOARD_SIZE and int(i) not in selected_list:
+                selected_list.append(int(i))
+        return cls(board, revealed_set, tuple(selected_list[:SPREAD_SIZE]), show_divination)
@@ -0,0 +1,143 @@
+"""
+向量化棋盤產生器
+以 NumPy 的 Generator 一次產生大量棋盤，回傳 (n, 32) uint8 種類編碼陣列。
+棋盤依固定大小分區，每區使用 SeedSequence(seed) 的第 k 個子序列，
+因此同一 seed 下第 i 個棋盤的內容與產生的批次大小、程序數無關，可在任何程序中重現
+
+用法：generate_boards(1_000_000, seed=42)、generate_boards(1, seed=42, offset=123456)
+檢查可重現性：python board_generator.py [--seed 19] [-n 32868]
+"""
+
+import argparse
+import functools
+import sys
+from typing import Callable, Dict, List, Union
+
+import numpy as np
+
+from models.xiangqi import ChessPiece, KIND_COUNTS, XiangqiBoard, piece_for_kind
+from board_codec import BOARD_SIZE, GameState, encode_board
+
+# 整副32隻棋子的種類編碼
+DECK = np.repeat(np.arange(len(KIND_COUNTS), dtype=np.uint8), KIND_COUNTS)
+
+BLOCK_SIZE = 16_384  # 每個亂數子序列產生的棋盤數
+KEY_SHIFT = 5        # 排序鍵低5位元存放原位置（0~31）
+POSITION_MASK = (1 << KEY_SHIFT) - 1
+_POSITIONS = np.arange(BOARD_SIZE, dtype=np.uint32)
+
+SeedLike = Union[None, int, np.random.SeedSequence]
+
+def shuffle_decks(rng: np.random.Generator, count: int,
+                  row_rng: Callable[[int], np.random.Generator]) -> np.ndarray:
+    """產生 count 副完整洗牌的棋子，回傳 (count, 32) 種類編碼
+
+    每個位置配一個隨機排序鍵（高27位元隨機、低5位元為原位置）後整列排序；
+    排序鍵的隨機部分相同時該列由 row_rng(列號) 的亂數重新抽取，使每種排列的機率完全相等；
+    重新抽取不使用 rng，因此第 i 列的結果只取決於 rng 的前 i+1 列，與 count 無關
+    """
+    keys = _random_keys(rng, count)
+    row_generators: Dict[int, np.random.Generator] = {}
+    while True:
+        randoms = keys >> KEY_SHIFT
+        tied = np.flatnonzero((randoms[:, 1:] == randoms[:, :-1]).any(axis=1))
+        if not tied.size:
+            break
+        for row in tied.tolist():
+            generator = row_generators.get(row)
+            if generator is None:
+                generator = row_generators[row] = row_rng(row)
+            keys[row] = _random_keys(generator, 1)[0]
+    return DECK[keys & POSITION_MASK]
+
+def _random_keys(rng: np.random.Generator, count: int) -> np.ndarray:
+    keys = rng.integers(0, 1 << 32, (count, BOARD_SIZE), dtype=np.uint32)
+    keys <<= KEY_SHIFT
+    keys |= _POSITIONS
+    keys.sort(axis=1)
+    return keys
+
+def draw_kinds(rng: np.random.Generator, count: int, draws: int) -> np.ndarray:
+    """洗牌後只取前 draws 隻（部分 Fisher-Yates），回傳 (count, draws) 種類編碼
+
+    只需 draws 次交換，適合只用到前幾隻的模擬（如卦象的5隻）
+    """
+    decks = np.tile(DECK[:, None], (1, count))  # 轉置存放，每次交換都是連續的列
+    columns = np.arange(count)
+    for position in range(min(draws, BOARD_SIZE - 1)):
+        swap = rng.integers(position, BOARD_SIZE, count, dtype=np.intp)
+        drawn = decks[swap, columns]
+        decks[swap, columns] = decks[position]
+        decks[position] = drawn
+    return np.ascontiguousarray(decks[:draws].T)
+
+def _block_rng(root: np.random.SeedSequence, block: int, *row: int) -> np.random.Generator:
+    # 等同 root.spawn() 的第 block 個子序列，但不需依序產生；指定 row 時為該分區第 row 列重新抽取用的子序列
+    child = np.random.SeedSequence(root.entropy, spawn_key=root.spawn_key + (block, *row),
+                                   pool_size=root.pool_size)
+    return np.random.default_rng(child)
+
+def generate_boards(n: int, seed: SeedLike = None, offset: int = 0) -> np.ndarray:
+    """產生第 offset ~ offset+n-1 個棋盤，回傳 (n, 32) uint8 種類編碼"""
+    if n < 0 or offset < 0:
+        raise ValueError("n 與 offset 不可為負數")
+    root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    boards = np.empty((n, BOARD_SIZE), dtype=np.uint8)
+    filled = 0
+    while filled < n:
+        index = offset + filled
+        block, start = divmod(index, BLOCK_SIZE)
+        take = min(BLOCK_SIZE - start, n - filled)
+        # 排序鍵相同的列由該列固定的子序列重新抽取，結果與本次產生的數量及起點無關
+        row_rng = functools.partial(_block_rng, root, block)
+        boards[filled:filled + take] = shuffle_decks(_block_rng(root, block), start + take, row_rng)[start:]
+        filled += take
+    return boards
+
+def check_reproducible(seed: SeedLike = 19, n: int = 2 * BLOCK_SIZE + 100, chunk: int = 1000) -> bool:
+    """檢查同一 seed 下第 i 個棋盤與產生的數量及 offset 無關：
+    一次產生 n 個、逐段以 offset 產生、只產生前 i+1 個與單獨產生第 i 個的結果必須一致
+    （預設 seed 19 的第 14908 列排序鍵相同，須重新抽取）"""
+    boards = generate_boards(n, seed)
+    chunks = [generate_boards(min(chunk, n - offset), seed, offset) for offset in range(0, n, chunk)]
+    if not (np.concatenate(chunks) == boards).all():
+        return False
+    for index in (0, chunk - 1, BLOCK_SIZE - 1, BLOCK_SIZE, n - 1, *np.random.default_rng(0).integers(0, n, 16).tolist()):
+        if not (generate_boards(index + 1, seed)[index] == boards[index]).all():
+            return False
+        if not (generate_boards(1, seed, offset=index)[0] == boards[index]).all():
+            return False
+    return True
+
+# --- 轉換 ---
+def board_pieces(kinds: np.ndarray) -> List[ChessPiece]:
+    """單一棋盤的種類編碼轉為棋子列表"""
+    return [piece_for_kind(int(kind)) for kind in kinds]
+
+def to_xiangqi_board(kinds: np.ndarray) -> XiangqiBoard:
+    """轉為 XiangqiBoard"""
+    return XiangqiBoard.from_pieces(board_pieces(kinds))
+
+def to_encoded_board(kinds: np.ndarray) -> str:
+    """轉為新局的 GameState 編碼（可由 GameState.decode 無損還原；前16字元即對局紀錄的 board_token）"""
+    return to_game_state(kinds).encode()
+
+def to_legacy_encoded_board(kinds: np.ndarray) -> str:
+    """轉為舊版 encode_board 格式（車與炮皆為 C，無法還原，僅供舊資料比對）"""
+    return encode_board(board_pieces(kinds))
+
+def to_game_state(kinds: np.ndarray) -> GameState:
+    """轉為新局的 GameState（可用 encode() 取得 URL 狀態）"""
+    return GameState(tuple(int(kind) for kind in kinds))
+
+def main():
+    parser = argparse.ArgumentParser(description="檢查棋盤產生器的可重現性")
+    parser.add_argument('--seed', type=int, default=19, help="亂數種子")
+    parser.add_argument('-n', type=int, default=2 * BLOCK_SIZE + 100, help="檢查的棋盤數")
+    args = parser.parse_args()
+    reproducible = check_reproducible(args.seed, args.n)
+    print("可重現" if reproducible else "不可重現：結果與產生的數量或 offset 有關")
+    sys.exit(0 if reproducible else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+棋盤渲染
+整個 4x8 棋盤為單一元件（st.components.v2）：每次只傳送一段 HTML，
+點擊時元件回傳該格位置（元件狀態），由回呼在同一工作階段內更新狀態（不重新載入頁面）。
+每格的 HTML 前後片段依 (棋子種類, 是否選擇) 快取，中間接位置編號
+"""
+
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from models.xiangqi import Color, piece_for_kind
+from board_codec import GameState
+
+BOARD_ROWS = 4
+BOARD_COLS = 8
+
+# 元件的樣式（元件的 HTML 位於 shadow root 內，頁面樣式不會套用）
+BOARD_CSS = """
+.xq-board {
+    display: grid; grid-template-columns: repeat(8, minmax(60px, 1fr)); row-gap: 10px;
+}
+.xq-cell {
+    width: 60px; height: 60px; display: flex; align-items: center; justify-content: center;
+    font: bold 16px sans-serif; border-radius: 50%; margin: 0 auto; padding: 0; cursor: pointer;
+    transition: all 0.2s ease; border: 4px solid #888;
+    background-color: #F5F5DC; color: #F5F5DC;
+}
+.xq-red { background-color: #dc3545; color: white; }
+.xq-black { background-color: #343a40; color: white; }
+.xq-selected { border: 4px solid #ffc107; box-shadow: 0 0 10px #ffc107; }
+"""
+
+# 元件的前端程式：每次更新只替換棋盤 HTML；點擊以事件委派將 data-cell 位置寫入元件狀態 click，
+# 附上遞增序號（不小於目前時間，元件重新掛載後仍遞增）讓重複點擊同一格（取消選擇）也視為新的值
+BOARD_JS = """
+let seq = 0;
+export default function(component) {
+    const { data, setStateValue, parentElement } = component;
+    let root = parentElement.querySelector('.xq-root');
+    if (!root) {
+        root = document.createElement('div');
+        root.className = 'xq-root';
+        parentElement.appendChild(root);
+    }
+    root.onclick = (event) => {
+        const cell = event.target.closest('[data-cell]');
+        if (cell) {
+            seq = Math.max(seq + 1, Date.now());
+            setStateValue('click', { cell: Number(cell.dataset.cell), seq: seq });
+        }
+    };
+    if (root.innerHTML !== data) {
+        root.innerHTML = data;
+    }
+}
+"""
+
+# 卦象區的棋子樣式
+GUA_CSS = """
+.chess-piece, .gua-number {
+    width: 60px; height: 60px; border-radius: 50%; display: flex; align-items: center;
+    justify-content: center; font-weight: bold; font-size: 16px; margin: 5px auto;
+    border: 2px solid #888; transition: all 0.3s ease; cursor: pointer;
+}
+.chess-piece-red { background-color: #dc3545 !important; color: white !important; }
+.chess-piece-black { background-color: #343a40 !important; color: white !important; }
+.gua-number { border: 2px solid #333; background-color: white; }
+"""
+
+# 整頁樣式：模組載入時組成一次，每次重新執行 app.py 直接重用
+PAGE_STYLE = f"<style>{GUA_CSS}</style>"
+
+@lru_cache(maxsize=None)
+def cell_fragments(kind: Optional[int], selected: bool) -> Tuple[str, str]:
+    """單格 HTML 的前後片段（中間接位置編號）；未翻開時 kind 為 None，不洩漏棋子內容"""
+    classes = ["xq-cell"]
+    if kind is None:
+        label = "&nbsp;"
+    else:
+        piece = piece_for_kind(kind)
+        classes.append("xq-red" if piece.color == Color.RED else "xq-black")
+        label = piece.display_name
+    if selected:
+        classes.append("xq-selected")
+    return f'<button class="{" ".join(classes)}" data-cell="', f'">{label}</button>'
+
+def render_board_html(state: GameState) -> str:
+    """輸出整個棋盤的 HTML；點擊每格由元件回傳該格位置"""
+    revealed = state.revealed
+    selected = state.selected
+    parts = ['<div class="xq-board">']
+    for index, kind in enumerate(state.board):
+        head, tail = cell_fragments(kind if index in revealed else None, index in selected)
+        parts.append(head)
+        parts.append(str(index))
+        parts.append(tail)
+    parts.append('</div>')
+    return "".join(parts)
@@ -0,0 +1,121 @@
+"""
+NumPy 批次卜卦引擎
+一次處理 (N, 5) 的種類編碼陣列，以整批陣列運算取得各項數值結果（不含文字）
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from models.xiangqi import (
+    Color, PieceType, PIECE_KINDS, SLOT_BITS, SPREAD_SIZE, piece_for_kind
+)
+from packed_spread import PIECE_TYPES, WU_XINGS
+from pattern_rules import TYPE_NAMES, compile_batch_evaluator
+
+# 各種類的屬性查詢表
+_KIND_PIECES = [piece_for_kind(kind) for kind in range(len(PIECE_KINDS))]
+KIND_IS_BLACK = np.array([piece.color == Color.BLACK for piece in _KIND_PIECES], dtype=np.uint8)
+KIND_TYPE = np.array([PIECE_TYPES.index(piece.piece_type) for piece in _KIND_PIECES], dtype=np.uint8)
+KIND_WU_XING = np.array([WU_XINGS.index(piece.wu_xing) for piece in _KIND_PIECES], dtype=np.uint8)
+KIND_POINTS = np.array([piece.points for piece in _KIND_PIECES], dtype=np.int32)
+
+# 三才各格包含的類型
+_TALENT_TYPES = [
+    [PieceType.GENERAL, PieceType.CHARIOT, PieceType.SOLDIER],
+    [PieceType.ADVISOR, PieceType.HORSE, PieceType.CANNON],
+    [PieceType.ELEPHANT, PieceType.SOLDIER],
+]
+_SLOT_WEIGHTS = (1 << np.arange(SPREAD_SIZE)).astype(np.uint8)
+
+@dataclass
+class DivinationBatchResult:
+    """批次卜卦結果（每個欄位為長度 N 的陣列）"""
+    red_count: np.ndarray          # (N,) 紅棋數量
+    yin_yang_balance: np.ndarray   # (N,) 是否陰陽平衡
+    balance_score: np.ndarray      # (N,) 平衡分數
+    missing_talents: np.ndarray    # (N,) 三才缺失遮罩，位元順序同 TALENT_LABELS
+    patterns: np.ndarray           # (N,) 格局遮罩，位元順序同 PATTERN_LABELS
+    wu_xing_counts: np.ndarray     # (N, 5) 五行數量，順序同 WuXing
+    same_color_points: np.ndarray  # (N,) 與中間同色的點數總和（含中間）
+    diff_color_points: np.ndarray  # (N,) 與中間異色的點數總和
+
+    def __len__(self) -> int:
+        return len(self.red_count)
+
+def kinds_from_codes(codes: np.ndarray) -> np.ndarray:
+    """將排列編碼陣列轉為 (N, 5) 種類編碼陣列"""
+    codes = np.asarray(codes, dtype=np.uint32)
+    shifts = (np.arange(SPREAD_SIZE) * SLOT_BITS).astype(np.uint32)
+    return ((codes[:, None] >> shifts) & 0xF).astype(np.uint8)
+
+def codes_from_kinds(kinds: np.ndarray) -> np.ndarray:
+    """將 (N, 5) 種類編碼陣列轉為排列編碼陣列"""
+    kinds = np.asarray(kinds, dtype=np.uint32)
+    shifts = (np.arange(SPREAD_SIZE) * SLOT_BITS).astype(np.uint32)
+    return (kinds << shifts).sum(axis=1, dtype=np.uint32)
+
+def _histogram(values: np.ndarray, size: int) -> np.ndarray:
+    return (values[..., None] == np.arange(size, dtype=values.dtype)).sum(axis=1, dtype=np.uint8)
+
+def perform_divination_batch(kinds: np.ndarray) -> DivinationBatchResult:
+    """批次解卦：kinds 為 (N, 5) 的 uint8 種類編碼，依中、左、右、上、下排列"""
+    kinds = np.asarray(kinds, dtype=np.uint8)
+    if kinds.ndim != 2 or kinds.shape[1] != SPREAD_SIZE:
+        raise ValueError(f"kinds 形狀必須為 (N, {SPREAD_SIZE})，實際為 {kinds.shape}")
+    if kinds.size and kinds.max() >= len(PIECE_KINDS):
+        raise ValueError("kinds 含有不存在的棋子種類")
+
+    black = KIND_IS_BLACK[kinds]
+    types = KIND_TYPE[kinds]
+    points = KIND_POINTS[kinds]
+
+    # 1. 陰陽平衡
+    black_count = black.sum(axis=1, dtype=np.uint8)
+    red_count = SPREAD_SIZE - black_count
+    yin_yang_balance = (red_count == 2) | (red_count == 3)
+    balance_score = np.where(yin_yang_balance, 100, 95).astype(np.uint8)
+
+    # 2. 各項計數
+    black_mask = (black * _SLOT_WEIGHTS).sum(axis=1, dtype=np.uint8)
+    type_counts = _histogram(types, len(PIECE_TYPES))
+    wu_xing_counts = _histogram(KIND_WU_XING[kinds], len(WU_XINGS))
+    kind_counts = _histogram(kinds, len(PIECE_KINDS))
+
+    def count(piece_type: PieceType) -> np.ndarray:
+        return type_counts[:, PIECE_TYPES.index(piece_type)]
+
+    # 3. 三才缺失
+    missing_talents = np.zeros(len(kinds), dtype=np.uint8)
+    for index, group in enumerate(_TALENT_TYPES):
+        present = sum(count(piece_type) for piece_type in group)
+        missing_talents |= (present == 0).astype(np.uint8) << index
+
+    # 4. 格局（由 pattern_rules 規則表編譯的批次判斷函式）
+    center = kinds[:, 0]
+    opposite_center = np.take_along_axis(kind_counts, (center ^ 1)[:, None].astype(np.intp), axis=1)[:, 0]
+    patterns = compile_batch_evaluator(np)(
+        mask=black_mask,
+        black_count=black_count,
+        kind_pairs=(kind_counts >= 2).any(axis=1),
+        center_type=KIND_TYPE[center],
+        opposite_center=opposite_center,
+        **{TYPE_NAMES[piece_type]: count(piece_type) for piece_type in PieceType}
+    )
+
+    # 5. 同色／異色點數
+    same_color = black == black[:, :1]
+    total_points = points.sum(axis=1)
+    same_color_points = (points * same_color).sum(axis=1)
+
+    return DivinationBatchResult(
+        red_count=red_count,
+        yin_yang_balance=yin_yang_balance,
+        balance_score=balance_score,
+        missing_talents=missing_talents,
+        patterns=patterns,
+        wu_xing_counts=wu_xing_counts,
+        same_color_points=same_color_points,
+        diff_color_points=total_points - same_color_points
+    )
+
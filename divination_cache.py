@@ -0,0 +1,101 @@
+"""
+卜卦結果快取
+以標準排列編碼（見 spread_symmetry）為鍵的程序層級 LRU 快取，左右互換的兩個排列共用一筆；
+快取項目為精簡結果（見 divination_compact），文字在渲染時才組合；
+可在 Streamlit 的多執行緒環境下共用，並提供命中、未命中與淘汰次數統計
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Union
+
+from models.xiangqi import ChessPiece, DivinationResult, SPREAD_SIZE, spread_code
+from divination_engine import perform_divination
+from metrics import register_stats
+from divination_compact import CompactDivinationResult, compact_result
+from spread_symmetry import canonical_code, mirror_pieces
+
+DEFAULT_CACHE_SIZE = int(os.environ.get('XIANGQI_CACHE_SIZE', 4096))
+
+class DivinationCache:
+    """執行緒安全的 LRU 卜卦結果快取（快取的結果為共用物件，請勿修改）"""
+
+    def __init__(self, maxsize: int = DEFAULT_CACHE_SIZE):
+        if maxsize <= 0:
+            raise ValueError("maxsize 必須大於 0")
+        self.maxsize = maxsize
+        self._entries: 'OrderedDict[int, CompactDivinationResult]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_or_compute(self, code: int, compute: Callable[[], CompactDivinationResult]) -> CompactDivinationResult:
+        """取得快取結果，未命中時呼叫 compute 計算並存入"""
+        with self._lock:
+            result = self._entries.get(code)
+            if result is not None:
+                self._entries.move_to_end(code)
+                self.hits += 1
+                return result
+            self.misses += 1
+
+        # 在鎖外計算，避免阻塞其他工作階段；同時未命中時可能重複計算，以先存入者為準
+        result = compute()
+
+        with self._lock:
+            existing = self._entries.get(code)
+            if existing is not None:
+                self._entries.move_to_end(code)
+                return existing
+            self._entries[code] = result
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return result
+
+    def clear(self):
+        """清空快取與統計"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """命中率等統計數據"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+DIVINATION_CACHE = DivinationCache()
+register_stats('xiangqi_divination_cache', DIVINATION_CACHE.stats, {
+    'hits': ('counter', "Divination cache hits."),
+    'misses': ('counter', "Divination cache misses."),
+    'evictions': ('counter', "Divination cache evictions."),
+    'size': ('gauge', "Number of cached divination results."),
+    'maxsize': ('gauge', "Divination cache capacity."),
+})
+
+def cached_divination(selected_pieces: List[ChessPiece]) -> Union[CompactDivinationResult, DivinationResult]:
+    """執行解卦並快取精簡結果（只快取標準排列，左右互換的排列共用標準排列的片段）；
+    不是5隻棋子時直接回傳完整結果"""
+    if len(selected_pieces) != SPREAD_SIZE:
+        return perform_divination(selected_pieces)
+    code = spread_code(selected_pieces)
+    canonical, mirrored = canonical_code(code)
+    if not mirrored:
+        return DIVINATION_CACHE.get_or_compute(code, lambda: compact_result(perform_divination(selected_pieces)))
+    canonical_pieces = mirror_pieces(selected_pieces)
+    result = DIVINATION_CACHE.get_or_compute(
+        canonical, lambda: compact_result(perform_divination(canonical_pieces)))
+    return CompactDivinationResult(code, result.fragments)
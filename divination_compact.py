@@ -0,0 +1,210 @@
+"""
+精簡卜卦結果
+解卦文字皆由固定且有限的片段組成（呈現狀態每行、互動關係與付出與收穫的每一句、
+健康分析的每一項與每條建議），精簡結果只存放排列編碼與各段的片段編號（數十位元組），
+陰陽平衡、三才與格局由排列編碼即時計算，文字在第一次讀取時才組合，之後由同一個實例沿用。
+
+片段編號由程序內的片段目錄依首次出現的順序指定，只在同一程序內有效；
+序列化時只保存排列編碼（見 CompactDivinationResult.__reduce__）。
+片段編號依標準排列（見 spread_symmetry）記錄，左右互換的排列共用同一份片段，組合文字時再還原左右描述
+"""
+
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+from models.xiangqi import ChessPiece, DivinationResult, piece_for_kind, spread_code, spread_kinds
+from packed_spread import decode_missing_talents, missing_talent_mask, red_count, spread_features
+from pattern_rules import decode_patterns, pattern_mask
+from divination_engine import balance_for_red_count, mirror_analysis, mirror_result
+from spread_symmetry import is_canonical, mirror_pieces
+
+POSITIONS = {'center': 0, 'left': 1, 'right': 2, 'top': 3, 'bottom': 4}
+
+# 文字欄位與切分片段的分隔字串（None 表示欄位本身即為片段列表）
+TEXT_SECTIONS: Tuple[Tuple[str, Any], ...] = (
+    ('state', "\n"),
+    ('interaction', "；"),
+    ('give_and_take', "；"),
+    ('health_analysis', "；"),
+    ('suggestions', None),
+)
+ANALYSIS_SECTIONS = ('state', 'interaction', 'give_and_take')
+
+# --- 片段編號的位元組編碼（LEB128 變長整數：小於128為1位元組，編號與片段數皆無上限） ---
+def append_varint(packed: bytearray, value: int):
+    while value >= 0x80:
+        packed.append(value & 0x7F | 0x80)
+        value >>= 7
+    packed.append(value)
+
+def read_varint(data: bytes, offset: int) -> Tuple[int, int]:
+    """讀取一個變長整數，回傳 (數值, 下一個位置)"""
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+class FragmentCatalog:
+    """片段文字 <-> 編號的目錄（執行緒安全，只增不減）"""
+
+    def __init__(self):
+        self._texts: List[str] = []
+        self._ids: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def intern(self, text: str) -> int:
+        """取得片段編號，首次出現時加入目錄"""
+        fragment_id = self._ids.get(text)
+        if fragment_id is not None:
+            return fragment_id
+        with self._lock:
+            fragment_id = self._ids.get(text)
+            if fragment_id is None:
+                # 先加入文字再公開編號：未加鎖的讀取者一旦查到編號，text() 必定可取得對應文字
+                fragment_id = len(self._texts)
+                self._texts.append(text)
+                self._ids[text] = fragment_id
+        return fragment_id
+
+    def text(self, fragment_id: int) -> str:
+        return self._texts[fragment_id]
+
+FRAGMENT_CATALOG = FragmentCatalog()
+
+@dataclass(frozen=True)
+class CompactDivinationResult:
+    """精簡卜卦結果：排列編碼 + 標準排列的片段編號，欄位與 DivinationResult 相同但皆為即時計算"""
+    # _sections 不是資料欄位：第一次讀取文字時才填入組合好的各段文字，不參與比較、雜湊與序列化
+    __slots__ = ('code', 'fragments', '_sections')
+
+    code: int         # 依中、左、右、上、下順序的排列編碼（實際選擇的順序）
+    fragments: bytes  # 依 TEXT_SECTIONS 順序，每段為片段數 + 各片段編號（皆為變長整數）
+
+    def __reduce__(self):
+        return compact_for_code, (self.code,)
+
+    # --- 由排列編碼計算的欄位 ---
+    @property
+    def selected_pieces(self) -> List[ChessPiece]:
+        return [piece_for_kind(kind) for kind in spread_kinds(self.code)]
+
+    @property
+    def positions(self) -> Dict[str, int]:
+        return dict(POSITIONS)
+
+    @property
+    def yin_yang_balance(self) -> bool:
+        return balance_for_red_count(red_count(spread_features(self.code)))[0]
+
+    @property
+    def balance_score(self) -> int:
+        return balance_for_red_count(red_count(spread_features(self.code)))[1]
+
+    @property
+    def missing_talents(self) -> List[str]:
+        return decode_missing_talents(missing_talent_mask(spread_features(self.code)))
+
+    @property
+    def pattern_mask(self) -> int:
+        """格局遮罩，位元順序同 pattern_rules.PATTERN_LABELS"""
+        return pattern_mask(self.code)
+
+    @property
+    def patterns(self) -> List[str]:
+        return decode_patterns(self.pattern_mask)
+
+    # --- 由片段組合的文字 ---
+    def _decoded_sections(self) -> Dict[str, Any]:
+        """各段文字，每個實例只組合一次（回傳內部物件，呼叫端不可修改）"""
+        try:
+            return self._sections
+        except AttributeError:
+            pass
+        sections: Dict[str, Any] = {}
+        fragments = self.fragments
+        offset = 0
+        for name, separator in TEXT_SECTIONS:
+            count, offset = read_varint(fragments, offset)
+            texts = []
+            for _ in range(count):
+                fragment_id, offset = read_varint(fragments, offset)
+                texts.append(FRAGMENT_CATALOG.text(fragment_id))
+            sections[name] = texts if separator is None else separator.join(texts)
+        if not is_canonical(self.code):
+            analysis = mirror_analysis({name: sections[name] for name in ANALYSIS_SECTIONS})
+            sections.update(analysis)
+        # 多個執行緒同時組合時結果相同，後寫入者覆蓋即可
+        object.__setattr__(self, '_sections', sections)
+        return sections
+
+    def sections(self) -> Dict[str, Any]:
+        """組合各段文字（左右互換的排列會還原左右描述）"""
+        sections = dict(self._decoded_sections())
+        sections['suggestions'] = list(sections['suggestions'])
+        return sections
+
+    @property
+    def analysis(self) -> Dict[str, str]:
+        sections = self._decoded_sections()
+        return {name: sections[name] for name in ANALYSIS_SECTIONS}
+
+    @property
+    def health_analysis(self) -> str:
+        return self._decoded_sections()['health_analysis']
+
+    @property
+    def suggestions(self) -> List[str]:
+        return list(self._decoded_sections()['suggestions'])
+
+    def expand(self) -> DivinationResult:
+        """還原為完整的 DivinationResult"""
+        sections = self.sections()
+        yin_yang_balance, balance_score = balance_for_red_count(red_count(spread_features(self.code)))
+        return DivinationResult(
+            selected_pieces=self.selected_pieces,
+            positions=self.positions,
+            yin_yang_balance=yin_yang_balance,
+            balance_score=balance_score,
+            missing_talents=self.missing_talents,
+            patterns=self.patterns,
+            analysis={name: sections[name] for name in ANALYSIS_SECTIONS},
+            health_analysis=sections['health_analysis'],
+            suggestions=sections['suggestions']
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """轉換為字典格式（同 DivinationResult.to_dict）"""
+        return self.expand().to_dict()
+
+def compact_result(result: DivinationResult) -> CompactDivinationResult:
+    """將完整結果壓縮為片段編號（非標準排列的結果會先換回標準排列的左右描述）"""
+    code = spread_code(result.selected_pieces)
+    if not is_canonical(code):
+        result = mirror_result(result, mirror_pieces(result.selected_pieces))
+    values = {
+        'state': result.analysis['state'],
+        'interaction': result.analysis['interaction'],
+        'give_and_take': result.analysis['give_and_take'],
+        'health_analysis': result.health_analysis,
+        'suggestions': result.suggestions,
+    }
+    packed = bytearray()
+    for name, separator in TEXT_SECTIONS:
+        texts = values[name] if separator is None else values[name].split(separator)
+        append_varint(packed, len(texts))
+        for text in texts:
+            append_varint(packed, FRAGMENT_CATALOG.intern(text))
+    return CompactDivinationResult(code, bytes(packed))
+
+def compact_for_code(code: int) -> CompactDivinationResult:
+    """由排列編碼取得精簡結果（經由程序快取，見 divination_cache）"""
+    from divination_cache import cached_divination
+    return cached_divination([piece_for_kind(kind) for kind in spread_kinds(code)])
@@ -3,11 +3,28 @@
 從原有的Flask路由中提取的卜卦邏輯
 """
 
-from typing import List, Dict, Any
-from models.xiangqi import ChessPiece, Color, PieceType, DivinationResult, WuXing
+from typing import List, Dict, Any, Optional, Tuple
+from models.xiangqi import ChessPiece, Color, PieceType, DivinationResult, WuXing, SPREAD_SIZE
+from divination_table import get_outcome_table
+from packed_spread import (
+    PIECE_TYPES, TALENT_LABELS, TALENT_PIECE_TYPES, WU_XINGS, decode_missing_talents, has_good_friend,
+    has_separation
+)
+from pattern_rules import decode_patterns, pattern_suggestions, patterns_to_mask
+from spread_features import SpreadFeatures, extract_features
+from metrics import instrument
 
 def perform_divination(selected_pieces: List[ChessPiece]) -> DivinationResult:
-    """執行解卦邏輯"""
+    """執行解卦：優先查詢預計算表，查無結果時以參考實作計算"""
+    table = get_outcome_table()
+    if table is not None:
+        result = table.result(selected_pieces)
+        if result is not None:
+            return result
+    return perform_divination_reference(selected_pieces)
+
+def perform_divination_reference(selected_pieces: List[ChessPiece]) -> DivinationResult:
+    """執行解卦邏輯（參考實作）"""
     
     # 位置映射：中間1，左邊2，右邊3，上方4，下方5
     positions = {
@@ -18,18 +35,17 @@ def perform_divination(selected_pieces: List[ChessPiece]) -> DivinationResult:
         'bottom': 4   # 下方
     }
     
-    # 1. 陰陽平衡判斷
-    red_count = sum(1 for piece in selected_pieces if piece.color == Color.RED)
-    black_count = sum(1 for piece in selected_pieces if piece.color == Color.BLACK)
+    # 0. 特徵擷取（各項分析共用）
+    features = extract_features(selected_pieces)
     
-    yin_yang_balance = (red_count == 2 and black_count == 3) or (red_count == 3 and black_count == 2)
-    balance_score = 100 if yin_yang_balance else 95  # 不平衡減5分
+    # 1. 陰陽平衡判斷
+    yin_yang_balance, balance_score = balance_for_red_count(features.red_count)
     
     # 2. 三才判斷
-    missing_talents = check_missing_talents(selected_pieces)
+    missing_talents = decode_missing_talents(features.missing_talents)
     
     # 3. 格局判斷
-    patterns = identify_patterns(selected_pieces)
+    patterns = decode_patterns(features.patterns)
     
     # 4. 分析
     analysis = {
@@ -39,10 +55,10 @@ def perform_divination(selected_pieces: List[ChessPiece]) -> DivinationResult:
     }
     
     # 5. 健康分析
-    health_analysis = analyze_health(selected_pieces)
+    health_analysis = analyze_health(selected_pieces, features)
     
     # 6. 建議
-    suggestions = generate_suggestions(selected_pieces, patterns, yin_yang_balance)
+    suggestions = generate_suggestions(selected_pieces, patterns, yin_yang_balance, features)
     
     return DivinationResult(
         selected_pieces=selected_pieces,
@@ -56,175 +72,45 @@ def perform_divination(selected_pieces: List[ChessPiece]) -> DivinationResult:
         suggestions=suggestions
     )
 
+def balance_for_red_count(red_count: int) -> Tuple[bool, int]:
+    """由紅棋數量判斷陰陽平衡與平衡分數（紅黑為2:3或3:2時平衡，不平衡減5分）"""
+    yin_yang_balance = red_count in (2, 3)
+    return yin_yang_balance, 100 if yin_yang_balance else 95
+
 def check_missing_talents(pieces: List[ChessPiece]) -> List[str]:
-    """檢查三才缺失"""
-    missing = []
-    
-    # 天格：將帥、車俥、兵卒
-    heaven_pieces = [PieceType.GENERAL, PieceType.CHARIOT, PieceType.SOLDIER]
-    if not any(piece.piece_type in heaven_pieces for piece in pieces):
-        missing.append("天格")
-    
-    # 人格：士仕、馬傌、炮包
-    human_pieces = [PieceType.ADVISOR, PieceType.HORSE, PieceType.CANNON]
-    if not any(piece.piece_type in human_pieces for piece in pieces):
-        missing.append("人格")
-    
-    # 地格：象相、卒
-    earth_pieces = [PieceType.ELEPHANT, PieceType.SOLDIER]
-    if not any(piece.piece_type in earth_pieces for piece in pieces):
-        missing.append("地格")
-    
-    return missing
+    """檢查三才缺失（天格：將帥、車俥、兵卒；人格：士仕、馬傌、炮包；地格：象相、卒）"""
+    if len(pieces) != SPREAD_SIZE:
+        # 不是完整卦象時逐隻檢查（排列編碼只能表示剛好5隻）
+        present = {piece.piece_type for piece in pieces}
+        return [label for label, piece_types in zip(TALENT_LABELS, TALENT_PIECE_TYPES)
+                if present.isdisjoint(piece_types)]
+    return decode_missing_talents(extract_features(pieces).missing_talents)
 
 def identify_patterns(pieces: List[ChessPiece]) -> List[str]:
     """識別格局"""
-    patterns = []
-    
-    # 檢查全紅全黑格
-    colors = [piece.color for piece in pieces]
-    if all(color == Color.RED for color in colors):
-        patterns.append("全紅格")
-    elif all(color == Color.BLACK for color in colors):
-        patterns.append("全黑格")
-    
-    # 檢查一枝獨秀格
-    red_count = sum(1 for piece in pieces if piece.color == Color.RED)
-    if red_count == 1 or red_count == 4:
-        patterns.append("一枝獨秀格")
-    
-    # 檢查聲聲格（中間與四周顏色不同）
-    center_piece = pieces[0]
-    surrounding_pieces = pieces[1:5]
-    if all(piece.color != center_piece.color for piece in surrounding_pieces):
-        if center_piece.color == Color.BLACK:
-            patterns.append("聲聲格（外人看好）")
-        else:
-            patterns.append("聲聲格（外人看不好）")
-    
-    # 檢查眾星拱月格（中間與四周顏色相同）
-    if all(piece.color == center_piece.color for piece in surrounding_pieces):
-        patterns.append("眾星拱月格")
-    
-    # 檢查十字天助格（1,2,3或1,4,5同色）
-    if ((pieces[0].color == pieces[1].color == pieces[2].color) or 
-        (pieces[0].color == pieces[3].color == pieces[4].color)):
-        patterns.append("十字天助格")
-    
-    # 檢查勝利格（2,3,5同色）
-    if pieces[1].color == pieces[2].color == pieces[4].color:
-        patterns.append("勝利格")
-    
-    # 檢查雨傘格（2,3,4同色）
-    if pieces[1].color == pieces[2].color == pieces[3].color:
-        patterns.append("雨傘格")
-    
-    # 檢查桃花格（包包或包將組合）
-    piece_types = [piece.piece_type for piece in pieces]
-    cannon_count = sum(1 for pt in piece_types if pt == PieceType.CANNON)
-    general_count = sum(1 for pt in piece_types if pt == PieceType.GENERAL)
-    
-    if cannon_count >= 2:
-        patterns.append("桃花格（包包）")
-    elif cannon_count >= 1 and general_count >= 1:
-        patterns.append("桃花格（包將）")
-    
-    # 檢查三人同心格
-    soldier_count = sum(1 for pt in piece_types if pt == PieceType.SOLDIER)
-    if soldier_count >= 3:
-        patterns.append("三人同心格")
-    
-    # 檢查事業格（象與車馬同時出現）
-    has_elephant = any(piece.piece_type == PieceType.ELEPHANT for piece in pieces)
-    has_chariot = any(piece.piece_type == PieceType.CHARIOT for piece in pieces)
-    has_horse = any(piece.piece_type == PieceType.HORSE for piece in pieces)
-    if has_elephant and (has_chariot or has_horse):
-        patterns.append("事業格")
-    
-    # 檢查富貴格（將帥與士象同時出現）
-    has_general = any(piece.piece_type == PieceType.GENERAL for piece in pieces)
-    has_advisor = any(piece.piece_type == PieceType.ADVISOR for piece in pieces)
-    if has_general and (has_advisor or has_elephant):
-        patterns.append("富貴格")
-    
-    # 檢查困擾格（兩對好朋友）
-    friend_pairs = count_friend_pairs(pieces)
-    if friend_pairs >= 2:
-        patterns.append("困擾格")
-    
-    # 檢查分離格（不同顏色的好朋友分開）
-    if check_separation_pattern(pieces):
-        patterns.append("分離格（離婚格）")
-    
-    # 檢查消耗格（兩支同色同類型棋子）
-    if check_consumption_pattern(pieces):
-        patterns.append("消耗格")
-    
-    # 檢查好朋友格
-    if check_good_friend_pattern(pieces):
-        patterns.append("好朋友格")
-    
-    return patterns
+    return decode_patterns(extract_features(pieces).patterns)
 
 def count_friend_pairs(pieces: List[ChessPiece]) -> int:
-    """計算好朋友對數"""
-    pairs = 0
-    piece_types = [piece.piece_type for piece in pieces]
-    
-    # 檢查士仕對
-    advisor_count = sum(1 for pt in piece_types if pt == PieceType.ADVISOR)
-    pairs += advisor_count // 2
-    
-    # 檢查包炮對
-    cannon_count = sum(1 for pt in piece_types if pt == PieceType.CANNON)
-    pairs += cannon_count // 2
-    
-    # 檢查馬傌對
-    horse_count = sum(1 for pt in piece_types if pt == PieceType.HORSE)
-    pairs += horse_count // 2
-    
-    return pairs
+    """計算好朋友對數（士仕、包炮、馬傌）"""
+    if len(pieces) != SPREAD_SIZE:
+        return sum(sum(1 for piece in pieces if piece.piece_type == piece_type) // 2
+                   for piece_type in (PieceType.ADVISOR, PieceType.CANNON, PieceType.HORSE))
+    return extract_features(pieces).friend_pairs
 
 def check_separation_pattern(pieces: List[ChessPiece]) -> bool:
     """檢查分離格"""
-    center = pieces[0]
-    left = pieces[1]
-    right = pieces[2]
-    top = pieces[3]
-    bottom = pieces[4]
-    
-    # 左右分離
-    if (left.color != center.color and right.color != center.color and 
-        left.color != right.color):
-        return True
-    
-    # 上下分離
-    if (top.color != center.color and bottom.color != center.color and 
-        top.color != bottom.color):
-        return True
-    
-    return False
+    return has_separation(extract_features(pieces).word)
 
 def check_consumption_pattern(pieces: List[ChessPiece]) -> bool:
-    """檢查消耗格"""
-    for i in range(len(pieces)):
-        for j in range(i + 1, len(pieces)):
-            if (pieces[i].piece_type == pieces[j].piece_type and 
-                pieces[i].color == pieces[j].color):
-                return True
-    return False
+    """檢查消耗格（兩隻同色同類型棋子）"""
+    if len(pieces) != SPREAD_SIZE:
+        return len({piece.kind for piece in pieces}) < len(pieces)
+    return extract_features(pieces).consumption
 
 def check_good_friend_pattern(pieces: List[ChessPiece]) -> bool:
     """檢查好朋友格"""
-    center = pieces[0]
-    surrounding = pieces[1:5]
-    
-    for piece in surrounding:
-        if piece.color != center.color:
-            if is_good_friend_combination(center, piece):
-                return True
-    
-    return False
+    features = extract_features(pieces)
+    return has_good_friend(features.code, features.word)
 
 def is_good_friend_combination(piece1: ChessPiece, piece2: ChessPiece) -> bool:
     """判斷是否為好朋友組合"""
@@ -300,53 +186,63 @@ def analyze_state(pieces: List[ChessPiece]) -> str:
 
     return "\n".join(full_analysis)
 
+# 互動關係：位置 -> (同色, 異色但互補, 異色)
+INTERACTION_TEXTS = {
+    1: ("與左方（同事/伴侶）關係和諧，價值觀相近",
+        "與左方雖有差異但能互補，關係良好",
+        "與左方存在價值觀差異，需要更多溝通"),
+    2: ("與右方（同事/家人）關係穩定，互相支持",
+        "與右方能夠互相學習，關係有益",
+        "與右方關係需要調整，避免衝突"),
+    3: ("與長輩/上司關係良好，容易獲得支持",
+        "與長輩/上司雖有不同但能獲得指導",
+        "與長輩/上司關係需要改善，可能有代溝"),
+    4: ("與晚輩/下屬關係融洽，能夠有效指導",
+        "與晚輩/下屬能夠教學相長",
+        "與晚輩/下屬關係需要耐心經營"),
+}
+
+def interaction_line(center: ChessPiece, piece: ChessPiece, slot: int) -> str:
+    """中間棋子與指定位置（1左、2右、3上、4下）棋子的互動關係"""
+    same_color, complementary, different = INTERACTION_TEXTS[slot]
+    if piece.color == center.color:
+        return same_color
+    if is_good_friend_combination(center, piece):
+        return complementary
+    return different
+
 def analyze_interaction(pieces: List[ChessPiece]) -> str:
-    """分析互動關係"""
+    """分析互動關係（依序為左方、右方、上方、下方）"""
     center = pieces[0]
-    left = pieces[1]
-    right = pieces[2]
-    top = pieces[3]
-    bottom = pieces[4]
-    
-    interactions = []
-    
-    # 分析與左方的關係
-    if left.color == center.color:
-        interactions.append("與左方（同事/伴侶）關係和諧，價值觀相近")
-    else:
-        if is_good_friend_combination(center, left):
-            interactions.append("與左方雖有差異但能互補，關係良好")
-        else:
-            interactions.append("與左方存在價值觀差異，需要更多溝通")
-    
-    # 分析與右方的關係
-    if right.color == center.color:
-        interactions.append("與右方（同事/家人）關係穩定，互相支持")
-    else:
-        if is_good_friend_combination(center, right):
-            interactions.append("與右方能夠互相學習，關係有益")
-        else:
-            interactions.append("與右方關係需要調整，避免衝突")
-    
-    # 分析與上方的關係
-    if top.color == center.color:
-        interactions.append("與長輩/上司關係良好，容易獲得支持")
-    else:
-        if is_good_friend_combination(center, top):
-            interactions.append("與長輩/上司雖有不同但能獲得指導")
-        else:
-            interactions.append("與長輩/上司關係需要改善，可能有代溝")
-    
-    # 分析與下方的關係
-    if bottom.color == center.color:
-        interactions.append("與晚輩/下屬關係融洽，能夠有效指導")
-    else:
-        if is_good_friend_combination(center, bottom):
-            interactions.append("與晚輩/下屬能夠教學相長")
-        else:
-            interactions.append("與晚輩/下屬關係需要耐心經營")
-    
-    return "；".join(interactions)
+    return "；".join(interaction_line(center, pieces[slot], slot) for slot in INTERACTION_TEXTS)
+
+def mirror_analysis(analysis: Dict[str, str]) -> Dict[str, str]:
+    """左右互換後的分析文字：呈現狀態的左右兩行對調，互動關係的左右描述依關係類別重新對應"""
+    state_lines = analysis['state'].split("\n")
+    # 呈現狀態最後四行依序為左、右、上、下的影響
+    state_lines[-4], state_lines[-3] = state_lines[-3], state_lines[-4]
+    interactions = analysis['interaction'].split("；")
+    left, right = interactions[0], interactions[1]
+    interactions[0] = INTERACTION_TEXTS[1][INTERACTION_TEXTS[2].index(right)]
+    interactions[1] = INTERACTION_TEXTS[2][INTERACTION_TEXTS[1].index(left)]
+    mirrored = dict(analysis)
+    mirrored['state'] = "\n".join(state_lines)
+    mirrored['interaction'] = "；".join(interactions)
+    return mirrored
+
+def mirror_result(result: DivinationResult, selected_pieces: List[ChessPiece]) -> DivinationResult:
+    """由左右互換排列的結果還原 selected_pieces 的結果（見 spread_symmetry）"""
+    return DivinationResult(
+        selected_pieces=selected_pieces,
+        positions=dict(result.positions),
+        yin_yang_balance=result.yin_yang_balance,
+        balance_score=result.balance_score,
+        missing_talents=list(result.missing_talents),
+        patterns=list(result.patterns),
+        analysis=mirror_analysis(result.analysis),
+        health_analysis=result.health_analysis,
+        suggestions=list(result.suggestions)
+    )
 
 def analyze_give_and_take(pieces: List[ChessPiece]) -> str:
     """分析付出與收穫"""
@@ -394,17 +290,15 @@ def analyze_give_and_take(pieces: List[ChessPiece]) -> str:
     
     return "；".join(analysis_parts)
 
-def analyze_health(pieces: List[ChessPiece]) -> str:
+def analyze_health(pieces: List[ChessPiece], features: Optional[SpreadFeatures] = None) -> str:
     """分析健康狀況"""
-    wu_xing_count = {}
-    for piece in pieces:
-        wu_xing = piece.wu_xing
-        wu_xing_count[wu_xing] = wu_xing_count.get(wu_xing, 0) + 1
+    if features is None:
+        features = extract_features(pieces)
     
     health_issues = []
     
-    # 檢查五行過多的情況
-    for wu_xing, count in wu_xing_count.items():
+    # 檢查五行過多的情況（五隻棋子中至多一種五行達3隻）
+    for wu_xing, count in zip(WU_XINGS, features.wu_xing_counts):
         if count >= 3:
             if wu_xing.value == "木":
                 health_issues.append("木過多：注意肝膽健康，避免過度勞累，控制情緒起伏")
@@ -419,7 +313,7 @@ def analyze_health(pieces: List[ChessPiece]) -> str:
     
     # 檢查五行缺失
     all_wu_xing = ["木", "火", "土", "金", "水"]
-    present_wu_xing = [wu_xing.value for wu_xing in wu_xing_count.keys()]
+    present_wu_xing = [wu_xing.value for wu_xing, count in zip(WU_XINGS, features.wu_xing_counts) if count]
     missing_wu_xing = [wx for wx in all_wu_xing if wx not in present_wu_xing]
     
     for missing in missing_wu_xing:
@@ -441,7 +335,7 @@ def analyze_health(pieces: List[ChessPiece]) -> str:
     elif center_piece.piece_type == PieceType.CANNON:
         health_issues.append("中間為包炮：注意腎臟和泌尿系統，避免過度緊張")
     
-    if check_consumption_pattern(pieces):
+    if features.consumption:
         health_issues.append("存在消耗格：注意身心平衡，避免過度消耗體力和精神")
     
     if not health_issues:
@@ -449,64 +343,26 @@ def analyze_health(pieces: List[ChessPiece]) -> str:
     
     return "；".join(health_issues)
 
-def generate_suggestions(pieces: List[ChessPiece], patterns: List[str], yin_yang_balance: bool) -> List[str]:
+def generate_suggestions(pieces: List[ChessPiece], patterns: List[str], yin_yang_balance: bool,
+                         features: Optional[SpreadFeatures] = None) -> List[str]:
     """生成建議"""
+    if features is None:
+        features = extract_features(pieces)
     suggestions = []
     
     # 陰陽平衡建議
     if not yin_yang_balance:
-        red_count = sum(1 for piece in pieces if piece.color == Color.RED)
-        if red_count > 3:
+        if features.red_count > 3:
             suggestions.append("紅棋過多，建議多與內斂穩重的人交流，學習沉穩的處事方式")
         else:
             suggestions.append("黑棋過多，建議多與積極主動的人接觸，增加外向表達的機會")
     
-    # 格局相關建議
-    if "全紅格" in patterns or "全黑格" in patterns:
-        suggestions.append("格局過於單一，建議多元化發展，接觸不同類型的人和事物，避免思維僵化")
-    
-    if "一枝獨秀格" in patterns:
-        suggestions.append("雖然獨特出眾，但要注意與他人的協調合作，避免孤立無援")
-    
-    if any("聲聲格" in pattern for pattern in patterns):
-        if "聲聲格（外人看好）" in patterns:
-            suggestions.append("外界對您評價良好，但要注意內在修養，避免表裡不一")
-        else:
-            suggestions.append("外界可能對您有誤解，建議多展現真實的自己，改善外在形象")
-    
-    if "十字天助格" in patterns:
-        suggestions.append("有天助之象，是發展的好時機，建議把握機會積極進取")
-    
-    if "勝利格" in patterns:
-        suggestions.append("具有勝利的潛質，建議保持信心，堅持努力，成功在望")
-    
-    if "雨傘格" in patterns:
-        suggestions.append("有長輩庇護，但也要培養獨立能力，避免過度依賴")
-    
-    if any("桃花格" in pattern for pattern in patterns):
-        suggestions.append("人際關係豐富，異性緣佳，但要注意感情專一，避免桃花劫")
-    
-    if "事業格" in patterns:
-        suggestions.append("適合專注事業發展，有成功的潛質，但要注意工作與生活的平衡")
-    
-    if "富貴格" in patterns:
-        suggestions.append("有富貴之象，容易得到貴人相助，建議善用人際關係，回饋社會")
-    
-    if "困擾格" in patterns:
-        suggestions.append("面臨選擇困難，建議冷靜分析利弊，必要時尋求專業建議")
-    
-    if "分離格" in patterns:
-        suggestions.append("人際關係可能面臨考驗，建議加強溝通，化解誤會，維護重要關係")
-    
-    if "消耗格" in patterns:
-        suggestions.append("存在能量消耗，建議適度休息，避免過度勞累，注意身心平衡")
-    
-    if "好朋友格" in patterns:
-        suggestions.append("人際關係良好，有互助的朋友，建議珍惜友誼，互相扶持")
+    # 格局相關建議（見 pattern_rules 規則表）
+    suggestions.extend(pattern_suggestions(patterns_to_mask(patterns)))
     
     # 根據中間棋子和組合給出具體建議
     center_piece = pieces[0]
-    piece_types_in_selection = {p.piece_type for p in pieces}
+    piece_types_in_selection = {piece_type for piece_type, count in zip(PIECE_TYPES, features.type_counts) if count}
 
     if center_piece.piece_type == PieceType.GENERAL:
         suggestion = "具有領導才能，建議培養包容心，學會授權，避免事必躬親。"
@@ -547,12 +403,7 @@ def generate_suggestions(pieces: List[ChessPiece], patterns: List[str], yin_yang
         suggestions.append(suggestion)
     
     # 健康相關建議
-    wu_xing_count = {}
-    for piece in pieces:
-        wu_xing = piece.wu_xing
-        wu_xing_count[wu_xing] = wu_xing_count.get(wu_xing, 0) + 1
-    
-    for wu_xing, count in wu_xing_count.items():
+    for wu_xing, count in zip(WU_XINGS, features.wu_xing_counts):
         if count >= 3:
             if wu_xing.value == "土":
                 suggestions.append("脾胃較弱，建議規律飲食，少食多餐，避免暴飲暴食")
@@ -565,3 +416,9 @@ def generate_suggestions(pieces: List[ChessPiece], patterns: List[str], yin_yang
         suggestions.append("多與不同類型的人交流，擴展視野，增加人生閱歷")
     
     return suggestions
+
+# --- 耗時統計（XIANGQI_METRICS=1 時才替換為計時版本）---
+instrument(globals(), 'engine', [
+    'perform_divination', 'perform_divination_reference', 'extract_features',
+    'analyze_state', 'analyze_interaction', 'analyze_give_and_take', 'analyze_health', 'generate_suggestions',
+])
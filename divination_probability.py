@@ -0,0 +1,153 @@
+"""
+精確機率計算
+以整副32隻棋子的多重集合加權枚舉所有合法的五子排列（權重為各種類取出數的下降階乘乘積），
+不需展開 32·31·30·29·28 種取法，即可得到每個格局、三才缺失與健康分析分支的精確機率
+
+用法：python divination_probability.py [--json]
+"""
+
+import argparse
+import json
+from fractions import Fraction
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from models.xiangqi import KIND_COUNTS, SPREAD_SIZE, PieceType, WuXing
+from packed_spread import PIECE_TYPES, TALENT_LABELS
+from pattern_rules import PATTERN_BITS, PATTERN_LABELS
+from divination_batch import KIND_TYPE, codes_from_kinds, perform_divination_batch
+
+DECK_SIZE = sum(KIND_COUNTS)
+
+# 有序取5隻的總取法數：32·31·30·29·28
+TOTAL_DRAWS = int(np.prod(np.arange(DECK_SIZE - SPREAD_SIZE + 1, DECK_SIZE + 1), dtype=np.int64))
+
+# 健康分析的各分支（依 analyze_health 的輸出順序）
+HEALTH_BRANCHES = (
+    [f"{wu_xing.value}過多" for wu_xing in WuXing]
+    + [f"缺{wu_xing.value}" for wu_xing in WuXing]
+    + ["中間為兵卒", "中間為包炮", "存在消耗格", "五行相對平衡"]
+)
+HEALTH_ORDER = {label: index for index, label in enumerate(HEALTH_BRANCHES)}
+
+def _falling_factorials() -> np.ndarray:
+    """各種類取出 m 隻的取法數：count·(count-1)···(count-m+1)"""
+    table = np.zeros((len(KIND_COUNTS), SPREAD_SIZE + 1), dtype=np.int64)
+    for kind, count in enumerate(KIND_COUNTS):
+        value = 1
+        for taken in range(SPREAD_SIZE + 1):
+            table[kind, taken] = value
+            value *= max(count - taken, 0)
+    return table
+
+@lru_cache(maxsize=1)
+def legal_spreads() -> Tuple[np.ndarray, np.ndarray]:
+    """所有合法的五子排列及其取法數權重：回傳 ((M, 5) 種類編碼, (M,) 權重)"""
+    kind_total = len(KIND_COUNTS)
+    grid = np.indices((kind_total,) * SPREAD_SIZE, dtype=np.uint8).reshape(SPREAD_SIZE, -1).T
+    counts = (grid[..., None] == np.arange(kind_total, dtype=np.uint8)).sum(axis=1)
+    legal = (counts <= np.array(KIND_COUNTS)).all(axis=1)
+    kinds = grid[legal]
+    counts = counts[legal]
+    factorials = _falling_factorials()
+    weights = np.prod(factorials[np.arange(kind_total), counts], axis=1)
+    return kinds, weights
+
+@lru_cache(maxsize=1)
+def legal_results():
+    """所有合法排列的批次解卦結果（順序同 legal_spreads）"""
+    kinds, _ = legal_spreads()
+    return perform_divination_batch(kinds)
+
+def _weighted(condition: np.ndarray, weights: np.ndarray) -> Fraction:
+    return Fraction(int(weights[condition].sum()), TOTAL_DRAWS)
+
+def _health_conditions(kinds: np.ndarray, patterns: np.ndarray, wu_xing_counts: np.ndarray) -> Dict[str, np.ndarray]:
+    center_type = KIND_TYPE[kinds[:, 0]]
+    conditions = {}
+    for index, wu_xing in enumerate(WuXing):
+        conditions[f"{wu_xing.value}過多"] = wu_xing_counts[:, index] >= 3
+    for index, wu_xing in enumerate(WuXing):
+        conditions[f"缺{wu_xing.value}"] = wu_xing_counts[:, index] == 0
+    conditions["中間為兵卒"] = center_type == PIECE_TYPES.index(PieceType.SOLDIER)
+    conditions["中間為包炮"] = center_type == PIECE_TYPES.index(PieceType.CANNON)
+    conditions["存在消耗格"] = (patterns & PATTERN_BITS["消耗格"]) != 0
+    any_issue = np.zeros(len(kinds), dtype=bool)
+    for condition in conditions.values():
+        any_issue |= condition
+    conditions["五行相對平衡"] = ~any_issue
+    return conditions
+
+@lru_cache(maxsize=1)
+def exact_probabilities() -> Dict[str, Dict[str, Fraction]]:
+    """各格局、三才缺失與健康分析分支的精確機率"""
+    kinds, weights = legal_spreads()
+    result = legal_results()
+
+    patterns = {label: _weighted((result.patterns & PATTERN_BITS[label]) != 0, weights)
+                for label in PATTERN_LABELS}
+    talents = {label: _weighted((result.missing_talents >> index) & 1 == 1, weights)
+               for index, label in enumerate(TALENT_LABELS)}
+    health = {label: _weighted(condition, weights)
+              for label, condition in _health_conditions(kinds, result.patterns, result.wu_xing_counts).items()}
+    balance = {str(score): _weighted(result.balance_score == score, weights)
+               for score in np.unique(result.balance_score)}
+
+    return {
+        'patterns': patterns,
+        'missing_talents': talents,
+        'health': health,
+        'balance_scores': balance,
+    }
+
+@lru_cache(maxsize=1)
+def _spread_weights() -> Dict[int, int]:
+    kinds, weights = legal_spreads()
+    return dict(zip(codes_from_kinds(kinds).tolist(), weights.tolist()))
+
+def spread_probability(code: int) -> Fraction:
+    """指定排列（20位元編碼）被依序抽出的精確機率"""
+    return Fraction(_spread_weights().get(code, 0), TOTAL_DRAWS)
+
+def pattern_set_probability(mask: int) -> Fraction:
+    """格局組合（遮罩）完全相同的排列出現的精確機率"""
+    _, weights = legal_spreads()
+    return _weighted(legal_results().patterns == mask, weights)
+
+def format_report(probabilities: Dict[str, Dict[str, Fraction]]) -> List[str]:
+    """將機率整理為文字報表（健康分析依 HEALTH_BRANCHES 的順序排列）"""
+    titles = {
+        'patterns': "格局",
+        'missing_talents': "三才缺失",
+        'health': "健康分析",
+        'balance_scores': "平衡分數",
+    }
+    lines = [f"總取法數：{TOTAL_DRAWS}"]
+    for section, title in titles.items():
+        lines.append("")
+        lines.append(f"【{title}】")
+        items = list(probabilities[section].items())
+        if section == 'health':
+            items.sort(key=lambda item: HEALTH_ORDER.get(item[0], len(HEALTH_ORDER)))
+        for label, probability in items:
+            lines.append(f"  {label}\t{float(probability):.6%}\t({probability.numerator}/{probability.denominator})")
+    return lines
+
+def main():
+    parser = argparse.ArgumentParser(description="計算各格局與分析分支的精確機率")
+    parser.add_argument('--json', action='store_true', help="以 JSON 輸出")
+    args = parser.parse_args()
+
+    probabilities = exact_probabilities()
+    if args.json:
+        payload = {section: {label: {'probability': float(value), 'fraction': str(value)}
+                             for label, value in values.items()}
+                   for section, values in probabilities.items()}
+        print(json.dumps(payload, ensure_ascii=False, indent=2))
+    else:
+        print("\n".join(format_report(probabilities)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+串流批次解卦
+從標準輸入或檔案逐行讀取卦象，分批送到多個工作程序解卦，
+依輸入順序逐行輸出 DivinationResult.to_dict 的 JSON（JSONL）；
+同時處理中的批次數有上限，記憶體用量與輸入大小無關
+
+每行可以是：
+- JSON 卦象（種類編碼列表、字典列表或字串，見 board_codec.decode_spread）
+- JSON 物件 {"spread": 卦象, "id": 任意值}，輸出時保留 id
+- 未加引號的逗號分隔字串（舊版 encode_board 代碼或顯示名稱）
+無法解析的行輸出 {"line": 行號, "error": 訊息}，不中斷處理
+
+用法：python divination_rescore.py readings.jsonl -o rescored.jsonl --processes 8
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+from board_codec import decode_spread
+from divination_cache import cached_divination
+
+CHUNK_SIZE = 512  # 每批送到工作程序的行數
+WINDOW = 2        # 每個工作程序同時排隊的批次數
+
+def score_line(line: str) -> Dict[str, Any]:
+    """解析並解卦一行輸入，格式不正確時拋出 ValueError"""
+    text = line.strip()
+    record_id = None
+    if text[:1] in ('[', '{', '"'):
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError as exc:
+            raise ValueError(f"JSON 格式不正確：{exc.msg}") from exc
+        except RecursionError as exc:
+            raise ValueError("JSON 巢狀層數過深") from exc
+        if isinstance(value, dict):
+            if 'spread' not in value:
+                raise ValueError("缺少 spread 欄位")
+            record_id = value.get('id')
+            value = value['spread']
+    else:
+        value = text
+
+    result = cached_divination(decode_spread(value)).to_dict()
+    if record_id is not None:
+        result = {'id': record_id, **result}
+    return result
+
+def score_chunk(chunk: List[Tuple[int, str]]) -> List[str]:
+    """解卦一批 (行號, 輸入行)，回傳已序列化的輸出行（在工作程序中執行）"""
+    output = []
+    for number, line in chunk:
+        try:
+            # 序列化也在此處：id 可為任意 JSON 值，巢狀過深時 json.dumps 同樣會超過遞迴上限
+            output.append(json.dumps(score_line(line), ensure_ascii=False))
+        except (ValueError, TypeError, KeyError, RecursionError) as exc:
+            # 任一行的錯誤只影響該行，不可讓例外離開工作程序而中斷整批
+            output.append(json.dumps({'line': number, 'error': str(exc)}, ensure_ascii=False))
+    return output
+
+def iter_chunks(lines: Iterable[str], chunk_size: int) -> Iterator[List[Tuple[int, str]]]:
+    """將非空白行依序切分為 (行號, 行) 的批次；行號從1起算"""
+    numbered = ((number, line) for number, line in enumerate(lines, 1) if line.strip())
+    while True:
+        chunk = list(islice(numbered, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+def rescore(lines: Iterable[str], processes: int = os.cpu_count() or 1,
+            chunk_size: int = CHUNK_SIZE, window: int = WINDOW) -> Iterator[str]:
+    """依輸入順序產生輸出行；processes 為 0 時在目前程序中計算"""
+    chunks = iter_chunks(lines, chunk_size)
+    if processes <= 0:
+        for chunk in chunks:
+            yield from score_chunk(chunk)
+        return
+
+    max_pending = max(1, processes * window)
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(score_chunk, chunk))
+            if len(pending) >= max_pending:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+def main():
+    parser = argparse.ArgumentParser(description="串流批次解卦（JSONL 輸入／輸出）")
+    parser.add_argument('input', nargs='?', default='-', help="輸入檔（預設為標準輸入）")
+    parser.add_argument('-o', '--output', default='-', help="輸出檔（預設為標準輸出）")
+    parser.add_argument('--processes', type=int, default=os.cpu_count(), help="工作程序數（0 表示不使用子程序）")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="每批行數")
+    parser.add_argument('--window', type=int, default=WINDOW, help="每個工作程序同時排隊的批次數")
+    args = parser.parse_args()
+
+    source = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+    target = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    started = time.perf_counter()
+    count = 0
+    try:
+        for line in rescore(source, args.processes, args.chunk_size, args.window):
+            target.write(line)
+            target.write("\n")
+            count += 1
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+    print(f"已處理 {count} 行，耗時 {time.perf_counter() - started:.1f} 秒", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+卜卦 JSON 服務
+以 asyncio 實作的輕量 HTTP/1.1 服務（支援 keep-alive），將解卦與棋盤產生以 JSON 提供給
+其他前端使用；解卦在執行緒或行程池中執行，並以號誌限制同時進行的工作數
+
+端點：
+    GET  /health               服務狀態與快取統計（使用行程池時各行程各有快取，不回傳快取統計）
+    GET  /board[?seed=N]       產生新棋盤
+    POST /divination           {"spread": 卦象} -> 解卦結果
+    POST /divination/batch     {"spreads": [卦象, ...]} -> {"results": [...]}
+
+卦象格式見 board_codec.decode_spread
+
+啟動：python divination_service.py [--host 127.0.0.1] [--port 8080] [--processes N]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from models.xiangqi import XiangqiBoard
+from board_generator import board_pieces, generate_boards
+from board_codec import GameState, decode_spread
+from divination_cache import DIVINATION_CACHE, cached_divination
+
+DEFAULT_HOST = os.environ.get('XIANGQI_SERVICE_HOST', '127.0.0.1')
+DEFAULT_PORT = int(os.environ.get('XIANGQI_SERVICE_PORT', 8080))
+DEFAULT_CONCURRENCY = int(os.environ.get('XIANGQI_SERVICE_CONCURRENCY', os.cpu_count() or 4))
+MAX_BATCH_SIZE = int(os.environ.get('XIANGQI_SERVICE_MAX_BATCH', 10000))
+MAX_BODY_BYTES = 8 << 20
+MAX_HEADER_LINES = 100
+KEEP_ALIVE_TIMEOUT = 15.0
+
+REASONS = {
+    200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+    408: 'Request Timeout', 411: 'Length Required', 413: 'Payload Too Large',
+    500: 'Internal Server Error', 501: 'Not Implemented',
+}
+
+class HttpError(Exception):
+    """回傳給用戶端的 HTTP 錯誤"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+# --- 工作函式（可在行程池中執行） ---
+def divine_spread(spread: Any) -> Dict[str, Any]:
+    """解析並解卦單一卦象，回傳 DivinationResult.to_dict"""
+    return cached_divination(decode_spread(spread)).to_dict()
+
+def divine_batch(spreads: List[Any]) -> List[Dict[str, Any]]:
+    """批次解卦；格式不正確的卦象以 {"error": 訊息} 表示，不影響其他結果"""
+    results = []
+    for spread in spreads:
+        try:
+            results.append(divine_spread(spread))
+        except ValueError as exc:
+            results.append({'error': str(exc)})
+    return results
+
+def generate_board(seed: Optional[int] = None) -> Dict[str, Any]:
+    """產生新棋盤；指定 seed 時結果可重現"""
+    if seed is None:
+        pieces = XiangqiBoard().pieces
+    else:
+        pieces = board_pieces(generate_boards(1, seed)[0])
+    state = GameState.from_pieces(pieces)
+    return {
+        'token': state.encode(),
+        'kinds': list(state.board),
+        'pieces': [piece.to_dict() for piece in pieces],
+    }
+
+# --- HTTP ---
+async def read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, str, Dict[str, str], bytes]]:
+    """讀取一個請求；連線在請求之間關閉時回傳 None"""
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), KEEP_ALIVE_TIMEOUT)
+    except asyncio.TimeoutError:
+        return None
+    if request_line in (b'\r\n', b'\n'):
+        # RFC 9112：請求前的空行應忽略
+        request_line = await reader.readline()
+    if not request_line:
+        return None
+    try:
+        method, target, version = request_line.decode('latin-1').split()
+    except ValueError:
+        raise HttpError(400, "請求行格式不正確")
+
+    headers: Dict[str, str] = {}
+    for _ in range(MAX_HEADER_LINES):
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    else:
+        raise HttpError(400, "標頭過多")
+
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        raise HttpError(501, "不支援 chunked 傳輸")
+    body = b''
+    if method == 'POST':
+        if 'content-length' not in headers:
+            raise HttpError(411, "需要 Content-Length")
+        value = headers['content-length']
+        # int() 也接受 "-1"、"+5"、" 5" 與 "1_0"，只允許十進位數字
+        if not value.isdigit() or not value.isascii():
+            raise HttpError(400, "Content-Length 格式不正確")
+        length = int(value)
+        if length > MAX_BODY_BYTES:
+            raise HttpError(413, "請求內容過大")
+        body = await reader.readexactly(length)
+    return method, target, version, headers, body
+
+def render_response(status: int, payload: Any, keep_alive: bool) -> bytes:
+    body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    head = (
+        f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+        f"Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return head.encode('latin-1') + body
+
+def wants_keep_alive(version: str, headers: Dict[str, str]) -> bool:
+    connection = headers.get('connection', '').lower()
+    if version == 'HTTP/1.0':
+        return connection == 'keep-alive'
+    return connection != 'close'
+
+def parse_json(body: bytes) -> Any:
+    try:
+        return json.loads(body)
+    except (UnicodeDecodeError, json.JSONDecodeError, RecursionError):
+        # 過深的巢狀結構使 json 模組超過遞迴上限
+        raise HttpError(400, "JSON 格式不正確")
+
+class DivinationService:
+    """卜卦 HTTP 服務"""
+
+    def __init__(self, executor: Optional[Executor] = None, concurrency: int = DEFAULT_CONCURRENCY):
+        self.executor = executor or ThreadPoolExecutor(max_workers=concurrency)
+        # 行程池中的解卦使用各行程自己的快取，本行程的 DIVINATION_CACHE 不會有任何紀錄
+        self.shared_cache = not isinstance(self.executor, ProcessPoolExecutor)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.requests = 0
+
+    async def run(self, func, *args) -> Any:
+        """在執行器中執行 CPU 工作，同時進行的工作數受號誌限制"""
+        async with self.semaphore:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def dispatch(self, method: str, target: str, body: bytes) -> Tuple[int, Any]:
+        url = urlsplit(target)
+        path = url.path.rstrip('/') or '/'
+
+        if path == '/health':
+            self._require(method, 'GET')
+            health: Dict[str, Any] = {'status': 'ok', 'requests': self.requests}
+            if self.shared_cache:
+                health['cache'] = DIVINATION_CACHE.stats()
+            return 200, health
+
+        if path == '/board':
+            self._require(method, 'GET')
+            seed = parse_qs(url.query).get('seed')
+            try:
+                seed_value = int(seed[0]) if seed else None
+            except ValueError:
+                raise HttpError(400, "seed 必須是整數")
+            if seed_value is not None and seed_value < 0:
+                raise HttpError(400, "seed 不可為負數")
+            return 200, generate_board(seed_value)
+
+        if path == '/divination':
+            self._require(method, 'POST')
+            payload = parse_json(body)
+            if not isinstance(payload, dict) or 'spread' not in payload:
+                raise HttpError(400, "缺少 spread 欄位")
+            try:
+                return 200, await self.run(divine_spread, payload['spread'])
+            except ValueError as exc:
+                raise HttpError(400, str(exc))
+
+        if path == '/divination/batch':
+            self._require(method, 'POST')
+            payload = parse_json(body)
+            spreads = payload.get('spreads') if isinstance(payload, dict) else None
+            if not isinstance(spreads, list):
+                raise HttpError(400, "spreads 必須是列表")
+            if len(spreads) > MAX_BATCH_SIZE:
+                raise HttpError(413, f"每批最多 {MAX_BATCH_SIZE} 個卦象")
+            return 200, {'results': await self.run(divine_batch, spreads)}
+
+        raise HttpError(404, "找不到路徑")
+
+    @staticmethod
+    def _require(method: str, expected: str):
+        if method != expected:
+            raise HttpError(405, f"僅支援 {expected}")
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except HttpError as exc:
+                    writer.write(render_response(exc.status, {'error': exc.message}, False))
+                    break
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                if request is None:
+                    break
+
+                method, target, version, headers, body = request
+                keep_alive = wants_keep_alive(version, headers)
+                self.requests += 1
+                try:
+                    status, payload = await self.dispatch(method, target, body)
+                except HttpError as exc:
+                    status, payload = exc.status, {'error': exc.message}
+                except Exception as exc:
+                    status, payload = 500, {'error': f"伺服器錯誤：{exc}"}
+                writer.write(render_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def start(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> asyncio.AbstractServer:
+        """開始監聽，回傳 asyncio 伺服器（port 為 0 時由系統指定）"""
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+async def serve(host: str, port: int, concurrency: int, processes: int):
+    executor = ProcessPoolExecutor(max_workers=processes) if processes > 0 else None
+    service = DivinationService(executor, concurrency)
+    server = await service.start(host, port)
+    address = server.sockets[0].getsockname()
+    print(f"卜卦服務啟動於 http://{address[0]}:{address[1]}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="卜卦 JSON 服務")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help="同時進行的解卦工作數上限")
+    parser.add_argument('--processes', type=int, default=0, help="行程池大小（0 表示使用執行緒池）")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.concurrency, args.processes))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+蒙地卡羅卜卦模擬
+依 XiangqiBoard 的方式洗牌32隻棋子並依序取5隻，批次解卦後統計格局、三才、平衡分數與五行的出現頻率；
+樣本依固定大小分片，每片使用獨立的亂數流，在多個程序間平行計算後合併
+
+用法：python divination_simulation.py -n 100000000 --seed 42 --processes 8
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from models.xiangqi import SPREAD_SIZE, WuXing
+from board_generator import draw_kinds
+from packed_spread import TALENT_LABELS
+from pattern_rules import PATTERN_LABELS
+from divination_batch import perform_divination_batch
+
+SHARD_SIZE = 1_000_000  # 每個分片的樣本數（決定亂數流的切分，與程序數無關）
+CHUNK_SIZE = 65_536     # 分片內每批計算的樣本數，限制記憶體用量
+
+@dataclass
+class SimulationStats:
+    """模擬統計結果（可合併）"""
+    samples: int = 0
+    pattern_counts: np.ndarray = field(default_factory=lambda: np.zeros(len(PATTERN_LABELS), dtype=np.int64))
+    talent_missing_counts: np.ndarray = field(default_factory=lambda: np.zeros(len(TALENT_LABELS), dtype=np.int64))
+    balance_score_counts: Dict[int, int] = field(default_factory=dict)
+    wu_xing_excess_counts: np.ndarray = field(default_factory=lambda: np.zeros(len(WuXing), dtype=np.int64))
+    wu_xing_missing_counts: np.ndarray = field(default_factory=lambda: np.zeros(len(WuXing), dtype=np.int64))
+
+    def merge(self, other: 'SimulationStats') -> 'SimulationStats':
+        """合併另一份統計（就地更新）"""
+        self.samples += other.samples
+        self.pattern_counts += other.pattern_counts
+        self.talent_missing_counts += other.talent_missing_counts
+        for score, count in other.balance_score_counts.items():
+            self.balance_score_counts[score] = self.balance_score_counts.get(score, 0) + count
+        self.wu_xing_excess_counts += other.wu_xing_excess_counts
+        self.wu_xing_missing_counts += other.wu_xing_missing_counts
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        """轉換為字典格式（含次數與比例）"""
+        total = self.samples or 1
+
+        def rates(labels: List[str], counts: np.ndarray) -> Dict[str, Dict[str, Any]]:
+            return {label: {'count': int(count), 'rate': int(count) / total}
+                    for label, count in zip(labels, counts)}
+
+        wu_xing_labels = [wu_xing.value for wu_xing in WuXing]
+        return {
+            'samples': self.samples,
+            'patterns': rates(PATTERN_LABELS, self.pattern_counts),
+            'missing_talents': rates(TALENT_LABELS, self.talent_missing_counts),
+            'balance_scores': {str(score): {'count': count, 'rate': count / total}
+                               for score, count in sorted(self.balance_score_counts.items())},
+            'wu_xing_excess': rates(wu_xing_labels, self.wu_xing_excess_counts),
+            'wu_xing_missing': rates(wu_xing_labels, self.wu_xing_missing_counts),
+        }
+
+def draw_spreads(rng: np.random.Generator, count: int) -> np.ndarray:
+    """洗牌後依序取前5隻，回傳 (count, 5) 種類編碼"""
+    return draw_kinds(rng, count, SPREAD_SIZE)
+
+def tally(kinds: np.ndarray) -> SimulationStats:
+    """統計一批卦象"""
+    result = perform_divination_batch(kinds)
+    stats = SimulationStats(samples=len(kinds))
+    pattern_bits = (result.patterns[:, None] >> np.arange(len(PATTERN_LABELS), dtype=np.uint32)) & 1
+    stats.pattern_counts += pattern_bits.sum(axis=0, dtype=np.int64)
+    talent_bits = (result.missing_talents[:, None] >> np.arange(len(TALENT_LABELS), dtype=np.uint8)) & 1
+    stats.talent_missing_counts += talent_bits.sum(axis=0, dtype=np.int64)
+    scores, counts = np.unique(result.balance_score, return_counts=True)
+    stats.balance_score_counts = {int(score): int(count) for score, count in zip(scores, counts)}
+    stats.wu_xing_excess_counts += (result.wu_xing_counts >= 3).sum(axis=0, dtype=np.int64)
+    stats.wu_xing_missing_counts += (result.wu_xing_counts == 0).sum(axis=0, dtype=np.int64)
+    return stats
+
+def simulate_shard(seed_sequence: np.random.SeedSequence, samples: int) -> SimulationStats:
+    """以單一亂數流模擬一個分片"""
+    rng = np.random.default_rng(seed_sequence)
+    stats = SimulationStats()
+    remaining = samples
+    while remaining:
+        count = min(CHUNK_SIZE, remaining)
+        stats.merge(tally(draw_spreads(rng, count)))
+        remaining -= count
+    return stats
+
+def plan_shards(samples: int, seed: Optional[int] = None,
+                shard_size: int = SHARD_SIZE) -> Iterator[Tuple[np.random.SeedSequence, int]]:
+    """切分樣本並為每個分片產生獨立的亂數種子"""
+    shard_count = max(1, -(-samples // shard_size))
+    children = np.random.SeedSequence(seed).spawn(shard_count)
+    for index, child in enumerate(children):
+        yield child, min(shard_size, samples - index * shard_size)
+
+def simulate(samples: int, seed: Optional[int] = None, processes: Optional[int] = None,
+             shard_size: int = SHARD_SIZE) -> SimulationStats:
+    """執行模擬；相同 seed 與 shard_size 的結果與程序數無關"""
+    shards = list(plan_shards(samples, seed, shard_size))
+    stats = SimulationStats()
+    if processes == 1 or len(shards) == 1:
+        for seed_sequence, count in shards:
+            stats.merge(simulate_shard(seed_sequence, count))
+        return stats
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(simulate_shard, seed_sequence, count) for seed_sequence, count in shards]
+        for future in futures:
+            stats.merge(future.result())
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="蒙地卡羅卜卦模擬")
+    parser.add_argument('-n', '--samples', type=int, default=1_000_000, help="樣本數")
+    parser.add_argument('--seed', type=int, default=None, help="亂數種子")
+    parser.add_argument('--processes', type=int, default=os.cpu_count(), help="平行程序數")
+    parser.add_argument('--shard-size', type=int, default=SHARD_SIZE, help="每個分片的樣本數")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    stats = simulate(args.samples, args.seed, args.processes, args.shard_size)
+    report = stats.to_dict()
+    report['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
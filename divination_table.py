@@ -0,0 +1,253 @@
+"""
+卜卦結果預計算表
+枚舉所有合法的五子排列，以參考實作逐一解卦後壓縮存放；
+查詢時以排列編碼直接索引，不需重新計算分析文字。
+左右互換的兩個排列只存放標準排列（見 spread_symmetry），查詢時再還原左右描述
+
+建表：python divination_table.py [--output PATH]
+"""
+
+import argparse
+import hashlib
+import os
+import pickle
+import threading
+import time
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from models.xiangqi import (
+    ChessPiece, DivinationResult, KIND_COUNTS, SLOT_BITS, SPREAD_SIZE,
+    piece_for_kind, spread_code
+)
+from spread_symmetry import canonical_code, is_canonical
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TABLE_PATH = os.environ.get('XIANGQI_TABLE_PATH', os.path.join(BASE_DIR, 'divination_table.pkl'))
+
+# 影響解卦結果的原始碼，任一檔案變更後舊表即失效
+SOURCE_FILES = (
+    'divination_engine.py',
+    'packed_spread.py',
+    'pattern_rules.py',
+    'spread_features.py',
+    'spread_symmetry.py',
+    os.path.join('models', 'xiangqi.py'),
+)
+
+# 以唯一值池 + 索引欄位存放的欄位
+POOLED_FIELDS = ('balance', 'missing_talents', 'patterns', 'interaction',
+                 'give_and_take', 'health_analysis', 'suggestions')
+
+# 呈現狀態按行切分，每行以8位元片段編號存放
+STATE_SEPARATOR = "\n"
+FRAGMENT_BITS = 8
+
+def source_fingerprint() -> str:
+    """計算解卦相關原始碼的雜湊值"""
+    digest = hashlib.sha256()
+    for relative_path in SOURCE_FILES:
+        with open(os.path.join(BASE_DIR, relative_path), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def iter_legal_spreads() -> Iterator[Tuple[int, ...]]:
+    """依各種棋子的數量上限，枚舉所有合法的五子排列（種類編碼）"""
+    remaining = list(KIND_COUNTS)
+    spread: List[int] = []
+
+    def walk() -> Iterator[Tuple[int, ...]]:
+        if len(spread) == SPREAD_SIZE:
+            yield tuple(spread)
+            return
+        for code, count in enumerate(remaining):
+            if count:
+                remaining[code] -= 1
+                spread.append(code)
+                yield from walk()
+                spread.pop()
+                remaining[code] += 1
+
+    return walk()
+
+def code_from_kinds(kinds: Tuple[int, ...]) -> int:
+    """由各位置的種類編碼組成排列編碼"""
+    code = 0
+    for slot, kind in enumerate(kinds):
+        code |= kind << (slot * SLOT_BITS)
+    return code
+
+class OutcomeTable:
+    """預計算卜卦結果表"""
+
+    def __init__(self, fingerprint: str, positions: Dict[str, int], rows: array,
+                 columns: Dict[str, array], pools: Dict[str, List[Any]], fragments: List[str]):
+        self.fingerprint = fingerprint
+        self.positions = positions
+        self.rows = rows            # 標準排列編碼 -> 列號（0 表示不合法或非標準排列）
+        self.columns = columns      # 欄位 -> 各列的值池索引
+        self.pools = pools          # 欄位 -> 唯一值池
+        self.fragments = fragments  # 呈現狀態的文字片段
+
+    def __len__(self) -> int:
+        """存放的標準排列數"""
+        return len(self.columns['balance']) - 1
+
+    @classmethod
+    def build(cls) -> 'OutcomeTable':
+        """以參考實作計算所有合法的標準排列，建立結果表"""
+        from divination_engine import perform_divination_reference
+
+        kind_pieces = [piece_for_kind(code) for code in range(len(KIND_COUNTS))]
+        rows = array('I', bytes(4 << (SPREAD_SIZE * SLOT_BITS)))
+        columns = {field: array('H', [0]) for field in POOLED_FIELDS}
+        columns['state'] = array('Q', [0])
+        pools: Dict[str, List[Any]] = {field: [] for field in POOLED_FIELDS}
+        pool_index: Dict[str, Dict[Any, int]] = {field: {} for field in POOLED_FIELDS}
+        fragments: List[str] = []
+        fragment_index: Dict[str, int] = {}
+        positions: Dict[str, int] = {}
+
+        def intern(field: str, value: Any) -> int:
+            index = pool_index[field].get(value)
+            if index is None:
+                index = pool_index[field][value] = len(pools[field])
+                pools[field].append(value)
+            return index
+
+        def pack_state(text: str) -> int:
+            packed = 0
+            lines = text.split(STATE_SEPARATOR)
+            if len(lines) * FRAGMENT_BITS > 64 - FRAGMENT_BITS:
+                raise ValueError("呈現狀態行數超出欄位容量")
+            for line in reversed(lines):
+                index = fragment_index.get(line)
+                if index is None:
+                    index = fragment_index[line] = len(fragments)
+                    fragments.append(line)
+                packed = (packed << FRAGMENT_BITS) | (index + 1)
+            return packed
+
+        for kinds in iter_legal_spreads():
+            code = code_from_kinds(kinds)
+            if not is_canonical(code):
+                continue
+            result = perform_divination_reference([kind_pieces[kind] for kind in kinds])
+            positions = result.positions
+            values = {
+                'balance': (result.yin_yang_balance, result.balance_score),
+                'missing_talents': tuple(result.missing_talents),
+                'patterns': tuple(result.patterns),
+                'interaction': result.analysis['interaction'],
+                'give_and_take': result.analysis['give_and_take'],
+                'health_analysis': result.health_analysis,
+                'suggestions': tuple(result.suggestions),
+            }
+            rows[code] = len(columns['balance'])
+            for field, value in values.items():
+                columns[field].append(intern(field, value))
+            columns['state'].append(pack_state(result.analysis['state']))
+
+        if len(fragments) >= (1 << FRAGMENT_BITS):
+            raise ValueError("呈現狀態片段數超出編號容量")
+        for field in POOLED_FIELDS:
+            if len(pools[field]) > 0xFFFF:
+                raise ValueError(f"{field} 唯一值數量超出索引容量")
+        return cls(source_fingerprint(), dict(positions), rows, columns, pools, fragments)
+
+    def save(self, path: str = TABLE_PATH):
+        """寫入檔案"""
+        payload = {
+            'fingerprint': self.fingerprint,
+            'positions': self.positions,
+            'rows': self.rows,
+            'columns': self.columns,
+            'pools': self.pools,
+            'fragments': self.fragments,
+        }
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = TABLE_PATH) -> 'OutcomeTable':
+        """從檔案讀取"""
+        with open(path, 'rb') as f:
+            payload = pickle.load(f)
+        return cls(**payload)
+
+    def _state_text(self, packed: int) -> str:
+        lines = []
+        while packed:
+            lines.append(self.fragments[(packed & 0xFF) - 1])
+            packed >>= FRAGMENT_BITS
+        return STATE_SEPARATOR.join(lines)
+
+    def result(self, selected_pieces: List[ChessPiece]) -> Optional[DivinationResult]:
+        """查詢卜卦結果，排列不合法時回傳 None"""
+        if len(selected_pieces) != SPREAD_SIZE:
+            return None
+        code, mirrored = canonical_code(spread_code(selected_pieces))
+        row = self.rows[code]
+        if not row:
+            return None
+        columns = self.columns
+        pools = self.pools
+        yin_yang_balance, balance_score = pools['balance'][columns['balance'][row]]
+        analysis = {
+            'state': self._state_text(columns['state'][row]),
+            'interaction': pools['interaction'][columns['interaction'][row]],
+            'give_and_take': pools['give_and_take'][columns['give_and_take'][row]],
+        }
+        if mirrored:
+            from divination_engine import mirror_analysis
+            analysis = mirror_analysis(analysis)
+        return DivinationResult(
+            selected_pieces=selected_pieces,
+            positions=dict(self.positions),
+            yin_yang_balance=yin_yang_balance,
+            balance_score=balance_score,
+            missing_talents=list(pools['missing_talents'][columns['missing_talents'][row]]),
+            patterns=list(pools['patterns'][columns['patterns'][row]]),
+            analysis=analysis,
+            health_analysis=pools['health_analysis'][columns['health_analysis'][row]],
+            suggestions=list(pools['suggestions'][columns['suggestions'][row]])
+        )
+
+_table: Optional[OutcomeTable] = None
+_table_loaded = False
+_table_lock = threading.Lock()
+
+def get_outcome_table() -> Optional[OutcomeTable]:
+    """取得預計算表（每個程序只讀取一次），表不存在或已過期時回傳 None"""
+    global _table, _table_loaded
+    if not _table_loaded:
+        with _table_lock:
+            if not _table_loaded:
+                _table = _load_current_table(TABLE_PATH)
+                _table_loaded = True
+    return _table
+
+def _load_current_table(path: str) -> Optional[OutcomeTable]:
+    if not os.path.exists(path):
+        return None
+    table = OutcomeTable.load(path)
+    if table.fingerprint != source_fingerprint():
+        return None
+    return table
+
+def main():
+    parser = argparse.ArgumentParser(description="建立卜卦結果預計算表")
+    parser.add_argument('--output', default=TABLE_PATH, help="輸出檔案路徑")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    table = OutcomeTable.build()
+    table.save(args.output)
+    elapsed = time.perf_counter() - started
+    print(f"已建立 {len(table)} 種標準排列，片段 {len(table.fragments)} 個，"
+          f"耗時 {elapsed:.1f} 秒 -> {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+假設分析（what-if）
+將卦象的每個位置逐一換成其他可能的棋子，列出格局、陰陽平衡與互動關係的變化。
+以增量方式重新解卦：特徵字組只扣除舊棋子、加上新棋子，
+互動關係只重算與被替換位置相關的組合（替換中間時才需重算全部四組）
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Tuple
+
+from models.xiangqi import ChessPiece, KIND_COUNTS, SPREAD_SIZE, piece_for_kind, spread_code, spread_kinds
+from packed_spread import kind_count, red_count, replace_slot, spread_features
+from pattern_rules import pattern_mask
+from divination_engine import INTERACTION_TEXTS, balance_for_red_count, interaction_line
+
+SLOT_LABELS = ["中間", "左方", "右方", "上方", "下方"]
+WHAT_IF_CACHE_SIZE = 1024
+
+@dataclass(frozen=True)
+class Alternative:
+    """單一位置換成另一種棋子後的結果"""
+    slot: int
+    kind: int
+    patterns: int                           # 格局遮罩
+    yin_yang_balance: bool
+    balance_score: int
+    interactions: Tuple[Tuple[int, str], ...]  # 與原卦象不同的互動關係 (位置, 文字)
+
+    @property
+    def piece(self) -> ChessPiece:
+        return piece_for_kind(self.kind)
+
+@dataclass(frozen=True)
+class WhatIfReport:
+    """原卦象與各位置的替代結果"""
+    code: int
+    patterns: int
+    yin_yang_balance: bool
+    balance_score: int
+    interactions: Tuple[str, ...]                   # 原卦象的互動關係（依序為左、右、上、下）
+    alternatives: Tuple[Tuple[Alternative, ...], ...]  # 位置 -> 可行的替代棋子（依種類編碼排序）
+
+    def __len__(self) -> int:
+        return sum(len(slot_alternatives) for slot_alternatives in self.alternatives)
+
+def _interactions(pieces: List[ChessPiece], slots) -> Tuple[Tuple[int, str], ...]:
+    center = pieces[0]
+    return tuple((slot, interaction_line(center, pieces[slot], slot)) for slot in slots)
+
+@lru_cache(maxsize=WHAT_IF_CACHE_SIZE)
+def what_if_for_code(code: int) -> WhatIfReport:
+    """由排列編碼計算所有單一位置替換的結果"""
+    kinds = spread_kinds(code)
+    pieces = [piece_for_kind(kind) for kind in kinds]
+    features = spread_features(code)
+    base_interactions = dict(_interactions(pieces, INTERACTION_TEXTS))
+    yin_yang_balance, balance_score = balance_for_red_count(red_count(features))
+
+    alternatives = []
+    for slot in range(SPREAD_SIZE):
+        # 替換中間會影響全部四組互動，替換四周只影響該位置與中間的一組
+        affected = tuple(INTERACTION_TEXTS) if slot == 0 else (slot,)
+        slot_alternatives = []
+        for kind in range(len(KIND_COUNTS)):
+            if kind == kinds[slot]:
+                continue
+            new_code, new_features = replace_slot(code, features, slot, kind)
+            if kind_count(new_features, kind) > KIND_COUNTS[kind]:
+                continue  # 棋盤上沒有足夠的同種棋子
+            new_pieces = list(pieces)
+            new_pieces[slot] = piece_for_kind(kind)
+            new_balance, new_score = balance_for_red_count(red_count(new_features))
+            slot_alternatives.append(Alternative(
+                slot=slot,
+                kind=kind,
+                patterns=pattern_mask(new_code, new_features),
+                yin_yang_balance=new_balance,
+                balance_score=new_score,
+                interactions=tuple((position, text) for position, text in _interactions(new_pieces, affected)
+                                   if text != base_interactions[position]),
+            ))
+        alternatives.append(tuple(slot_alternatives))
+
+    return WhatIfReport(
+        code=code,
+        patterns=pattern_mask(code, features),
+        yin_yang_balance=yin_yang_balance,
+        balance_score=balance_score,
+        interactions=tuple(base_interactions.values()),
+        alternatives=tuple(alternatives),
+    )
+
+def what_if(pieces: List[ChessPiece]) -> WhatIfReport:
+    """計算五隻棋子的假設分析"""
+    return what_if_for_code(spread_code(pieces))
@@ -0,0 +1,240 @@
+"""
+各階段耗時統計
+以環境變數 XIANGQI_METRICS=1 開啟（於匯入時決定）；關閉時 instrument() 不包裝任何函式，
+stage() 回傳共用的空 context manager，幾乎沒有額外成本。
+統計為每個階段的延遲直方圖（次數、總和與累計分組），以及以 register_stats 登記的外部計數器與量表
+（例如卜卦快取的命中、未命中與淘汰次數），可輸出為 Prometheus 文字格式：
+- XIANGQI_METRICS_PORT：在本機該埠提供 /metrics
+- XIANGQI_METRICS_FILE：程序結束時寫入檔案（亦可呼叫 write_metrics）
+"""
+
+import atexit
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
+
+METRICS_ENABLED = os.environ.get('XIANGQI_METRICS', '').lower() in ('1', 'true', 'yes', 'on')
+METRICS_PORT = os.environ.get('XIANGQI_METRICS_PORT')
+METRICS_FILE = os.environ.get('XIANGQI_METRICS_FILE')
+
+F = TypeVar('F', bound=Callable[..., Any])
+
+METRIC_NAME = 'xiangqi_stage_duration_seconds'
+# 直方圖分組上限（秒）：10µs 到 5s
+BUCKETS: Tuple[float, ...] = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+
+class Histogram:
+    """延遲直方圖（執行緒安全）"""
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最後一格為 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+
+    def snapshot(self) -> Tuple[List[int], int, float]:
+        """(累計分組次數, 總次數, 總和)"""
+        with self._lock:
+            counts, count, total = list(self.counts), self.count, self.sum
+        cumulative = []
+        running = 0
+        for value in counts:
+            running += value
+            cumulative.append(running)
+        return cumulative, count, total
+
+_histograms: Dict[str, Histogram] = {}
+_histograms_lock = threading.Lock()
+
+def histogram(name: str) -> Histogram:
+    """取得（必要時建立）指定階段的直方圖"""
+    hist = _histograms.get(name)
+    if hist is None:
+        with _histograms_lock:
+            hist = _histograms.setdefault(name, Histogram())
+    return hist
+
+class _Stage:
+    __slots__ = ('histogram', 'started')
+
+    def __init__(self, name: str):
+        self.histogram = histogram(name)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+_NULL_STAGE = nullcontext()
+
+def stage(name: str):
+    """計時區塊：with stage('app.board_render'): ...（統計關閉時回傳共用的空 context manager）"""
+    if METRICS_ENABLED:
+        return _Stage(name)
+    return _NULL_STAGE
+
+def timed(name: str) -> Callable[[F], F]:
+    """將函式包裝為計時版本的裝飾器"""
+    def decorate(func: F) -> F:
+        hist = histogram(name)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                hist.observe(time.perf_counter() - started)
+        return wrapper  # type: ignore[return-value]
+    return decorate
+
+def instrument(namespace: Dict[str, Any], prefix: str, names: Iterable[str]):
+    """統計開啟時，將模組命名空間中的函式替換為計時版本
+
+    模組內部以全域名稱呼叫的函式也會經過計時版本；統計關閉時不做任何替換，沒有額外成本
+    """
+    if not METRICS_ENABLED:
+        return
+    for name in names:
+        namespace[name] = timed(f"{prefix}.{name}")(namespace[name])
+
+def reset():
+    """將所有統計歸零"""
+    with _histograms_lock:
+        histograms = list(_histograms.values())
+    for hist in histograms:
+        with hist._lock:
+            hist.counts = [0] * len(hist.counts)
+            hist.count = 0
+            hist.sum = 0.0
+
+# --- 外部統計 ---
+# (指標名稱前綴, 取得統計字典的函式, 統計鍵 -> (Prometheus 類型, 說明))
+_stats_sources: List[Tuple[str, Callable[[], Dict[str, Any]], Dict[str, Tuple[str, str]]]] = []
+_stats_lock = threading.Lock()
+
+def register_stats(prefix: str, stats: Callable[[], Dict[str, Any]], fields: Dict[str, Tuple[str, str]]):
+    """登記外部統計：fields 為 統計鍵 -> ('counter' 或 'gauge', 說明)，輸出時才呼叫 stats()
+
+    counter 輸出為 {prefix}_{鍵}_total，gauge 輸出為 {prefix}_{鍵}
+    """
+    for kind, _ in fields.values():
+        if kind not in ('counter', 'gauge'):
+            raise ValueError(f"不支援的指標類型：{kind}")
+    with _stats_lock:
+        _stats_sources.append((prefix, stats, dict(fields)))
+
+# --- Prometheus 輸出 ---
+def _format_float(value: float) -> str:
+    return repr(float(value))
+
+def _render_stats() -> List[str]:
+    lines = []
+    with _stats_lock:
+        sources = list(_stats_sources)
+    for prefix, stats, fields in sources:
+        values = stats()
+        for key, (kind, description) in fields.items():
+            name = f"{prefix}_{key}_total" if kind == 'counter' else f"{prefix}_{key}"
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {_format_float(values[key])}")
+    return lines
+
+def render_prometheus() -> str:
+    """以 Prometheus 文字格式輸出所有直方圖與外部統計"""
+    lines = [
+        f"# HELP {METRIC_NAME} Duration of each divination and app stage.",
+        f"# TYPE {METRIC_NAME} histogram",
+    ]
+    with _histograms_lock:
+        items = sorted(_histograms.items())
+    for name, hist in items:
+        cumulative, count, total = hist.snapshot()
+        label = name.replace('\\', '\\\\').replace('"', '\\"')
+        for bound, value in zip(hist.buckets, cumulative):
+            lines.append(f'{METRIC_NAME}_bucket{{stage="{label}",le="{_format_float(bound)}"}} {value}')
+        lines.append(f'{METRIC_NAME}_bucket{{stage="{label}",le="+Inf"}} {cumulative[-1]}')
+        lines.append(f'{METRIC_NAME}_sum{{stage="{label}"}} {_format_float(total)}')
+        lines.append(f'{METRIC_NAME}_count{{stage="{label}"}} {count}')
+    lines.extend(_render_stats())
+    return "\n".join(lines) + "\n"
+
+def write_metrics(path: str):
+    """將統計寫入檔案（先寫暫存檔再取代，避免讀到寫到一半的內容）"""
+    temporary = f"{path}.tmp"
+    with open(temporary, 'w', encoding='utf-8') as f:
+        f.write(render_prometheus())
+    os.replace(temporary, path)
+
+def serve_text(port: int, routes: Dict[str, Callable[[], Tuple[int, str]]],
+               host: str = '127.0.0.1') -> Optional['ThreadingHTTPServer']:
+    """在背景執行緒啟動簡易 HTTP 伺服器：routes 為 路徑 -> 回傳 (狀態碼, 文字內容) 的函式
+
+    埠已被占用時回傳 None；http.server 於此時才匯入，不影響啟動時間
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            route = routes.get(self.path.split('?')[0])
+            if route is None:
+                self.send_error(404)
+                return
+            status, text = route()
+            body = text.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    try:
+        server = ThreadingHTTPServer((host, port), Handler)
+    except OSError:
+        return None
+    threading.Thread(target=server.serve_forever, name=f'http-{port}', daemon=True).start()
+    return server
+
+_server: Optional['ThreadingHTTPServer'] = None
+_server_lock = threading.Lock()
+
+def start_metrics_server(port: int, host: str = '127.0.0.1') -> Optional['ThreadingHTTPServer']:
+    """在背景執行緒提供 /metrics；同一程序只啟動一次，埠已被占用時回傳 None"""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = serve_text(port, {'/metrics': lambda: (200, render_prometheus())}, host)
+    return _server
+
+def start_exporters():
+    """依環境變數啟動 /metrics 端點與結束時的檔案輸出（統計關閉時不做任何事）"""
+    if not METRICS_ENABLED:
+        return
+    if METRICS_PORT:
+        start_metrics_server(int(METRICS_PORT))
+    if METRICS_FILE:
+        atexit.register(write_metrics, METRICS_FILE)
+
+start_exporters()
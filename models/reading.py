@@ -0,0 +1,36 @@
+"""
+卜卦紀錄模型
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from models.xiangqi import spread_kinds
+
+@dataclass(frozen=True)
+class Reading:
+    """一次卜卦紀錄（卦象以排列編碼、格局以遮罩存放）"""
+    board_token: str      # 棋盤編碼（board_codec.encode_board_token）
+    spread_code: int      # 依中、左、右、上、下順序的排列編碼
+    pattern_mask: int     # 格局遮罩，位元順序同 pattern_rules.PATTERN_LABELS
+    balance_score: int
+    created_at: float     # UNIX 時間（秒）
+    user_id: Optional[int] = None
+    id: Optional[int] = None
+
+    @property
+    def kinds(self) -> List[int]:
+        """各位置的種類編碼"""
+        return spread_kinds(self.spread_code)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """轉換為字典"""
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'board_token': self.board_token,
+            'spread_code': self.spread_code,
+            'pattern_mask': self.pattern_mask,
+            'balance_score': self.balance_score,
+            'created_at': self.created_at
+        }
@@ -4,7 +4,7 @@
 
 from enum import Enum
 from dataclasses import dataclass
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 import random
 
 class PieceType(Enum):
@@ -30,48 +30,59 @@ class WuXing(Enum):
     METAL = "金"   # 將、士
     WATER = "水"   # 包
 
-@dataclass
+# 顯示名稱
+DISPLAY_NAMES = {
+    Color.RED: {
+        PieceType.GENERAL: "帥",
+        PieceType.ADVISOR: "仕",
+        PieceType.ELEPHANT: "相",
+        PieceType.CHARIOT: "俥",
+        PieceType.HORSE: "傌",
+        PieceType.CANNON: "炮",
+        PieceType.SOLDIER: "兵"
+    },
+    Color.BLACK: {
+        PieceType.GENERAL: "將",
+        PieceType.ADVISOR: "士",
+        PieceType.ELEPHANT: "象",
+        PieceType.CHARIOT: "車",
+        PieceType.HORSE: "馬",
+        PieceType.CANNON: "包",
+        PieceType.SOLDIER: "卒"
+    }
+}
+
+@dataclass(frozen=True)
 class ChessPiece:
-    """象棋棋子"""
+    """象棋棋子（不可變；同種類棋子共用 get_piece 回傳的同一個實例）"""
+    __slots__ = ('piece_type', 'color', 'points', 'wu_xing', 'display_name', 'kind', '_payload')
+
     piece_type: PieceType
     color: Color
     points: int
     wu_xing: WuXing
-    
-    @property
-    def display_name(self) -> str:
-        """顯示名稱"""
-        if self.color == Color.RED:
-            names = {
-                PieceType.GENERAL: "帥",
-                PieceType.ADVISOR: "仕", 
-                PieceType.ELEPHANT: "相",
-                PieceType.CHARIOT: "俥",
-                PieceType.HORSE: "傌",
-                PieceType.CANNON: "炮",
-                PieceType.SOLDIER: "兵"
-            }
-        else:
-            names = {
-                PieceType.GENERAL: "將",
-                PieceType.ADVISOR: "士",
-                PieceType.ELEPHANT: "象", 
-                PieceType.CHARIOT: "車",
-                PieceType.HORSE: "馬",
-                PieceType.CANNON: "包",
-                PieceType.SOLDIER: "卒"
-            }
-        return names[self.piece_type]
 
-    def to_dict(self) -> Dict[str, Any]:
-        """轉換為字典"""
-        return {
+    def __post_init__(self):
+        # 顯示名稱、種類編碼與字典內容在建立時計算一次
+        display_name = DISPLAY_NAMES[self.color][self.piece_type]
+        object.__setattr__(self, 'display_name', display_name)
+        object.__setattr__(self, 'kind', KIND_CODES[(self.piece_type, self.color)])
+        object.__setattr__(self, '_payload', {
             'type': self.piece_type.value,
             'color': self.color.value,
-            'display_name': self.display_name,
+            'display_name': display_name,
             'points': self.points,
             'wu_xing': self.wu_xing.value
-        }
+        })
+
+    def __reduce__(self):
+        if KIND_PIECES[self.kind] is self:
+            return piece_for_kind, (self.kind,)
+        return ChessPiece, (self.piece_type, self.color, self.points, self.wu_xing)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """轉換為字典"""
+        return dict(self._payload)
 
 class XiangqiBoard:
     """象棋棋盤"""
@@ -129,12 +140,16 @@ class XiangqiBoard:
         self.pieces = self._create_pieces()
         self._randomize_pieces()
     
+    @classmethod
+    def from_pieces(cls, pieces: List[ChessPiece]) -> 'XiangqiBoard':
+        """以指定順序的32隻棋子建立棋盤（不洗牌）"""
+        board = cls.__new__(cls)
+        board.pieces = list(pieces)
+        return board
+    
     def _create_pieces(self) -> List[ChessPiece]:
-        """創建所有棋子"""
-        pieces = []
-        for piece_type, color, points, wu_xing in self.PIECE_DEFINITIONS:
-            pieces.append(ChessPiece(piece_type, color, points, wu_xing))
-        return pieces
+        """取得所有棋子（同種類共用實例）"""
+        return [get_piece(piece_type, color) for piece_type, color, _, _ in self.PIECE_DEFINITIONS]
     
     def _randomize_pieces(self):
         """隨機化棋子順序"""
@@ -173,6 +188,52 @@ class XiangqiBoard:
             'total_pieces': 32
         }
 
+# 棋子種類編碼：依 (類型, 顏色) 排為 0~13，偶數為紅、奇數為黑
+PIECE_KINDS: List[Tuple[PieceType, Color]] = [(piece_type, color) for piece_type in PieceType for color in Color]
+KIND_CODES: Dict[Tuple[PieceType, Color], int] = {kind: code for code, kind in enumerate(PIECE_KINDS)}
+
+# 每種棋子在整副32隻中的數量
+KIND_COUNTS: List[int] = [
+    sum(1 for piece_type, color, _, _ in XiangqiBoard.PIECE_DEFINITIONS if (piece_type, color) == kind)
+    for kind in PIECE_KINDS
+]
+
+# 卦象位置數量與每個位置所佔的位元數
+SPREAD_SIZE = 5
+SLOT_BITS = 4
+
+def _create_kind_piece(piece_type: PieceType, color: Color) -> ChessPiece:
+    for def_type, def_color, points, wu_xing in XiangqiBoard.PIECE_DEFINITIONS:
+        if def_type == piece_type and def_color == color:
+            return ChessPiece(piece_type, color, points, wu_xing)
+    raise ValueError(f"未知的棋子種類: {piece_type}, {color}")
+
+# 14種棋子的共用實例，依種類編碼排列
+KIND_PIECES: List[ChessPiece] = [_create_kind_piece(piece_type, color) for piece_type, color in PIECE_KINDS]
+
+def piece_for_kind(code: int) -> ChessPiece:
+    """依種類編碼取得共用的棋子實例"""
+    return KIND_PIECES[code]
+
+def get_piece(piece_type: PieceType, color: Color) -> ChessPiece:
+    """依類型與顏色取得共用的棋子實例"""
+    return KIND_PIECES[KIND_CODES[(piece_type, color)]]
+
+def kind_code(piece: ChessPiece) -> int:
+    """棋子種類編碼"""
+    return piece.kind
+
+def spread_code(pieces: List[ChessPiece]) -> int:
+    """卦象排列編碼：依中、左、右、上、下順序，每個位置佔4位元"""
+    code = 0
+    for slot, piece in enumerate(pieces):
+        code |= piece.kind << (slot * SLOT_BITS)
+    return code
+
+def spread_kinds(code: int) -> List[int]:
+    """將排列編碼還原為各位置的種類編碼"""
+    return [(code >> (slot * SLOT_BITS)) & 0xF for slot in range(SPREAD_SIZE)]
+
 @dataclass
 class DivinationResult:
     """卜卦結果"""
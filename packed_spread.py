@@ -0,0 +1,159 @@
+"""
+位元壓縮的卦象表示
+排列編碼每個位置佔4位元（共20位元），配合預先計算的顏色／類型／五行遮罩，
+三才與各項格局條件皆以少數整數位元運算完成（格局規則表見 pattern_rules）
+"""
+
+from typing import List, Tuple
+
+from models.xiangqi import (
+    ChessPiece, Color, PieceType, WuXing, PIECE_KINDS, SLOT_BITS, SPREAD_SIZE,
+    piece_for_kind, spread_code
+)
+
+# --- 特徵字組配置 ---
+# 各欄位皆可相加：兩組位置的特徵字組相加即為合併後的特徵
+BLACK_MASK_OFFSET = 0      # 5位元：第 s 位為1表示位置 s 為黑棋
+BLACK_COUNT_OFFSET = 5     # 3位元：黑棋數量
+TYPE_COUNT_OFFSET = 8      # 7 x 3位元：各類型數量
+WU_XING_COUNT_OFFSET = 29  # 5 x 3位元：各五行數量
+KIND_COUNT_OFFSET = 44     # 14 x 3位元：各種類數量
+COUNT_BITS = 3
+
+SLOT_MASK = (1 << SPREAD_SIZE) - 1
+
+PIECE_TYPES = list(PieceType)
+WU_XINGS = list(WuXing)
+
+def _slot_features(slot: int, kind: int) -> int:
+    piece = piece_for_kind(kind)
+    is_black = 1 if piece.color == Color.BLACK else 0
+    return (
+        (is_black << (BLACK_MASK_OFFSET + slot))
+        + (is_black << BLACK_COUNT_OFFSET)
+        + (1 << (TYPE_COUNT_OFFSET + COUNT_BITS * PIECE_TYPES.index(piece.piece_type)))
+        + (1 << (WU_XING_COUNT_OFFSET + COUNT_BITS * WU_XINGS.index(piece.wu_xing)))
+        + (1 << (KIND_COUNT_OFFSET + COUNT_BITS * kind))
+    )
+
+def _build_half_table(first_slot: int, slot_count: int) -> List[int]:
+    table = []
+    for code in range(1 << (SLOT_BITS * slot_count)):
+        features = 0
+        for offset in range(slot_count):
+            kind = (code >> (offset * SLOT_BITS)) & 0xF
+            if kind >= len(PIECE_KINDS):
+                features = 0
+                break
+            features += _slot_features(first_slot + offset, kind)
+        table.append(features)
+    return table
+
+# 低12位元（中、左、右）與高8位元（上、下）各自查表後相加
+LOW_SLOTS = 3
+LOW_BITS = LOW_SLOTS * SLOT_BITS
+LOW_FEATURES = _build_half_table(0, LOW_SLOTS)
+HIGH_FEATURES = _build_half_table(LOW_SLOTS, SPREAD_SIZE - LOW_SLOTS)
+
+# 位置 -> 種類 -> 單一位置的特徵字組（替換單一位置時只需扣除舊值、加上新值）
+SLOT_FEATURES: List[List[int]] = [
+    [_slot_features(slot, kind) for kind in range(len(PIECE_KINDS))] for slot in range(SPREAD_SIZE)
+]
+
+def _type_field_mask(*piece_types: PieceType) -> int:
+    mask = 0
+    for piece_type in piece_types:
+        mask |= 0b111 << (TYPE_COUNT_OFFSET + COUNT_BITS * PIECE_TYPES.index(piece_type))
+    return mask
+
+def _type_shift(piece_type: PieceType) -> int:
+    return TYPE_COUNT_OFFSET + COUNT_BITS * PIECE_TYPES.index(piece_type)
+
+ADVISOR_SHIFT = _type_shift(PieceType.ADVISOR)
+HORSE_SHIFT = _type_shift(PieceType.HORSE)
+CANNON_SHIFT = _type_shift(PieceType.CANNON)
+
+# 三才：天格（將帥、車俥、兵卒）、人格（士仕、馬傌、炮包）、地格（象相、卒）
+TALENT_LABELS = ["天格", "人格", "地格"]
+TALENT_PIECE_TYPES = [
+    (PieceType.GENERAL, PieceType.CHARIOT, PieceType.SOLDIER),
+    (PieceType.ADVISOR, PieceType.HORSE, PieceType.CANNON),
+    (PieceType.ELEPHANT, PieceType.SOLDIER),
+]
+TALENT_FIELDS = [_type_field_mask(*piece_types) for piece_types in TALENT_PIECE_TYPES]
+
+# 各種類數量欄位的「>=2」位元（每欄的高兩位元）
+KIND_PAIR_MASK = sum(0b110 << (KIND_COUNT_OFFSET + COUNT_BITS * kind) for kind in range(len(PIECE_KINDS)))
+
+def pack_spread(pieces: List[ChessPiece]) -> int:
+    """將五隻棋子壓縮為20位元排列編碼"""
+    return spread_code(pieces)
+
+def spread_features(code: int) -> int:
+    """由排列編碼取得特徵字組"""
+    return LOW_FEATURES[code & ((1 << LOW_BITS) - 1)] + HIGH_FEATURES[code >> LOW_BITS]
+
+def replace_slot(code: int, features: int, slot: int, kind: int) -> Tuple[int, int]:
+    """將指定位置換成另一種棋子，回傳新的 (排列編碼, 特徵字組)"""
+    shift = slot * SLOT_BITS
+    old_kind = (code >> shift) & 0xF
+    slot_features = SLOT_FEATURES[slot]
+    return ((code & ~(0xF << shift)) | (kind << shift),
+            features - slot_features[old_kind] + slot_features[kind])
+
+def black_mask(features: int) -> int:
+    """黑棋位置遮罩"""
+    return (features >> BLACK_MASK_OFFSET) & SLOT_MASK
+
+def red_count(features: int) -> int:
+    """紅棋數量"""
+    return SPREAD_SIZE - ((features >> BLACK_COUNT_OFFSET) & 0b111)
+
+def type_count(features: int, piece_type: PieceType) -> int:
+    """指定類型的數量"""
+    return (features >> _type_shift(piece_type)) & 0b111
+
+def wu_xing_count(features: int, wu_xing: WuXing) -> int:
+    """指定五行的數量"""
+    return (features >> (WU_XING_COUNT_OFFSET + COUNT_BITS * WU_XINGS.index(wu_xing))) & 0b111
+
+def kind_count(features: int, kind: int) -> int:
+    """指定種類的數量"""
+    return (features >> (KIND_COUNT_OFFSET + COUNT_BITS * kind)) & 0b111
+
+def missing_talent_mask(features: int) -> int:
+    """三才缺失遮罩：位元順序同 TALENT_LABELS"""
+    mask = 0
+    for index, field in enumerate(TALENT_FIELDS):
+        if not features & field:
+            mask |= 1 << index
+    return mask
+
+def friend_pair_count(features: int) -> int:
+    """好朋友對數（士仕、包炮、馬傌）"""
+    return (((features >> ADVISOR_SHIFT) & 0b111) // 2
+            + ((features >> CANNON_SHIFT) & 0b111) // 2
+            + ((features >> HORSE_SHIFT) & 0b111) // 2)
+
+def has_separation(features: int) -> bool:
+    """分離格：左右或上下兩側皆與中間不同色且彼此不同色"""
+    mask = black_mask(features)
+    differs = mask ^ (SLOT_MASK if mask & 1 else 0)
+    left_right = (differs & 0b00110) == 0b00110 and ((mask >> 1) ^ (mask >> 2)) & 1
+    top_bottom = (differs & 0b11000) == 0b11000 and ((mask >> 3) ^ (mask >> 4)) & 1
+    return bool(left_right or top_bottom)
+
+def has_consumption(features: int) -> bool:
+    """消耗格：有兩隻以上同色同類型棋子"""
+    return bool(features & KIND_PAIR_MASK)
+
+def has_good_friend(code: int, features: int) -> bool:
+    """好朋友格：四周有與中間同類型但不同色的棋子（將帥除外）"""
+    center = code & 0xF
+    if PIECE_KINDS[center][0] == PieceType.GENERAL:
+        return False
+    return bool(kind_count(features, center ^ 1))
+
+def decode_missing_talents(mask: int) -> List[str]:
+    """將三才缺失遮罩還原為名稱列表"""
+    return [label for index, label in enumerate(TALENT_LABELS) if mask >> index & 1]
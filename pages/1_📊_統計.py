@@ -0,0 +1,70 @@
+import time
+
+import streamlit as st
+
+from pattern_rules import PATTERN_LABELS
+from packed_spread import TALENT_LABELS
+from reading_store import (
+    DAY, HOUR, METRIC_PATTERN, METRIC_READINGS, METRIC_TALENT, METRIC_WU_XING, WU_XING_IMBALANCE_LABELS,
+    get_reading_store
+)
+
+# --- CONFIG & SETUP ---
+st.set_page_config(
+    page_title="象棋卜卦 - 統計",
+    page_icon="📊",
+    layout="wide",
+    initial_sidebar_state="collapsed"
+)
+
+# 時間範圍 -> (秒數, 彙總區間)
+WINDOWS = {
+    "過去24小時": (DAY, HOUR),
+    "過去7天": (7 * DAY, DAY),
+    "過去30天": (30 * DAY, DAY),
+    "過去一年": (365 * DAY, DAY),
+}
+
+def ordered_counts(counts: dict, labels: list) -> dict:
+    """依固定標籤順序排列（含次數為0者），其餘標籤附在後面"""
+    ordered = {label: counts.get(label, 0) for label in labels}
+    ordered.update({label: count for label, count in counts.items() if label not in ordered})
+    return ordered
+
+def render_counts(title: str, counts: dict, total: int):
+    st.subheader(title)
+    if not total:
+        st.caption("沒有資料")
+        return
+    st.bar_chart(counts, horizontal=True)
+    st.dataframe(
+        [{"項目": label, "次數": count, "比例": f"{count / total:.1%}"} for label, count in counts.items()],
+        hide_index=True, width="stretch"
+    )
+
+def main():
+    st.title("📊 卜卦統計")
+    window = st.radio("時間範圍", list(WINDOWS), horizontal=True)
+    seconds, granularity = WINDOWS[window]
+    since = time.time() - seconds
+
+    # 只讀取彙總表：查詢筆數取決於時間範圍與標籤數，與紀錄總數無關
+    store = get_reading_store()
+    totals = store.rollup_totals(since, granularity)
+    total = totals.get(METRIC_READINGS, {}).get('', 0)
+
+    st.metric("卜卦次數", total)
+    series = store.rollup_series(METRIC_READINGS, since, granularity)
+    if series:
+        bucket_format = '%m-%d %H:00' if granularity == HOUR else '%Y-%m-%d'
+        st.line_chart({time.strftime(bucket_format, time.localtime(bucket)): count for bucket, _, count in series})
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        render_counts("✨ 格局", ordered_counts(totals.get(METRIC_PATTERN, {}), PATTERN_LABELS), total)
+    with col2:
+        render_counts("⚠️ 三才缺失", ordered_counts(totals.get(METRIC_TALENT, {}), TALENT_LABELS), total)
+    with col3:
+        render_counts("🏥 五行失衡", ordered_counts(totals.get(METRIC_WU_XING, {}), WU_XING_IMBALANCE_LABELS), total)
+
+main()
@@ -0,0 +1,328 @@
+"""
+格局規則表
+以宣告式的條件（位置、顏色、類型）描述每個格局及其對應建議；
+載入時將整張表編譯為單一特化的判斷函式，一次判斷所有格局，新增規則不增加額外的呼叫成本
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from models.xiangqi import Color, PieceType, SPREAD_SIZE
+from packed_spread import (
+    BLACK_COUNT_OFFSET, COUNT_BITS, KIND_COUNT_OFFSET, KIND_PAIR_MASK, PIECE_TYPES,
+    SLOT_MASK, TYPE_COUNT_OFFSET, spread_features
+)
+
+# 判斷函式中可用的類型計數變數名稱
+TYPE_NAMES = {piece_type: piece_type.name.lower() for piece_type in PieceType}
+
+# --- 條件 ---
+# 每個條件可輸出兩種原始碼：單筆判斷（scalar，使用 and/or/not）
+# 與 NumPy 批次判斷（vector，使用 &/|/~）
+
+def _slot_bits(*positions: int) -> int:
+    """位置編號（1為中間、2左、3右、4上、5下）轉為顏色遮罩位元"""
+    bits = 0
+    for position in positions:
+        if not 1 <= position <= SPREAD_SIZE:
+            raise ValueError(f"位置必須介於 1 到 {SPREAD_SIZE}")
+        bits |= 1 << (position - 1)
+    return bits
+
+class Condition:
+    """格局條件"""
+
+    def scalar(self) -> str:
+        raise NotImplementedError
+
+    def vector(self) -> str:
+        raise NotImplementedError
+
+@dataclass(frozen=True)
+class SameColor(Condition):
+    """指定位置皆同色"""
+    positions: Tuple[int, ...]
+
+    def __init__(self, *positions: int):
+        object.__setattr__(self, 'positions', positions)
+
+    def scalar(self) -> str:
+        bits = _slot_bits(*self.positions)
+        return f"(mask & {bits} == 0 or mask & {bits} == {bits})"
+
+    def vector(self) -> str:
+        bits = _slot_bits(*self.positions)
+        return f"(((mask & {bits}) == 0) | ((mask & {bits}) == {bits}))"
+
+@dataclass(frozen=True)
+class SlotColors(Condition):
+    """指定位置為指定顏色"""
+    colors: Tuple[Tuple[int, Color], ...]
+
+    def __init__(self, colors: Dict[int, Color]):
+        object.__setattr__(self, 'colors', tuple(sorted(colors.items())))
+
+    def _bits(self) -> Tuple[int, int]:
+        slots = _slot_bits(*(position for position, _ in self.colors))
+        black = _slot_bits(*(position for position, color in self.colors if color == Color.BLACK))
+        return slots, black
+
+    def scalar(self) -> str:
+        slots, black = self._bits()
+        return f"(mask & {slots} == {black})"
+
+    def vector(self) -> str:
+        slots, black = self._bits()
+        return f"((mask & {slots}) == {black})"
+
+@dataclass(frozen=True)
+class ColorsDiffer(Condition):
+    """兩個位置顏色不同"""
+    first: int
+    second: int
+
+    def scalar(self) -> str:
+        return f"((mask >> {self.first - 1} ^ mask >> {self.second - 1}) & 1 == 1)"
+
+    def vector(self) -> str:
+        return f"((((mask >> {self.first - 1}) ^ (mask >> {self.second - 1})) & 1) == 1)"
+
+@dataclass(frozen=True)
+class RedCount(Condition):
+    """紅棋數量為指定值之一"""
+    counts: Tuple[int, ...]
+
+    def __init__(self, *counts: int):
+        object.__setattr__(self, 'counts', counts)
+
+    def scalar(self) -> str:
+        return "(" + " or ".join(f"black_count == {SPREAD_SIZE - count}" for count in self.counts) + ")"
+
+    def vector(self) -> str:
+        return "(" + " | ".join(f"(black_count == {SPREAD_SIZE - count})" for count in self.counts) + ")"
+
+@dataclass(frozen=True)
+class TypeCount(Condition):
+    """指定類型的數量：至少 at_least 隻，或恰好 exactly 隻"""
+    piece_type: PieceType
+    at_least: int = 1
+    exactly: Optional[int] = None
+
+    def scalar(self) -> str:
+        name = TYPE_NAMES[self.piece_type]
+        if self.exactly is not None:
+            return f"({name} == {self.exactly})"
+        return f"({name} >= {self.at_least})"
+
+    vector = scalar
+
+@dataclass(frozen=True)
+class PairTotal(Condition):
+    """指定類型中成對（同類型兩隻）的對數至少 at_least 對"""
+    piece_types: Tuple[PieceType, ...]
+    at_least: int
+
+    def scalar(self) -> str:
+        pairs = " + ".join(f"{TYPE_NAMES[piece_type]} // 2" for piece_type in self.piece_types)
+        return f"({pairs} >= {self.at_least})"
+
+    vector = scalar
+
+@dataclass(frozen=True)
+class DuplicateKind(Condition):
+    """有兩隻以上同色同類型的棋子"""
+
+    def scalar(self) -> str:
+        return "kind_pairs"
+
+    vector = scalar
+
+@dataclass(frozen=True)
+class CenterType(Condition):
+    """中間棋子為指定類型"""
+    piece_type: PieceType
+
+    def scalar(self) -> str:
+        return f"(center_type == {PIECE_TYPES.index(self.piece_type)})"
+
+    vector = scalar
+
+@dataclass(frozen=True)
+class CenterCounterpart(Condition):
+    """四周有與中間同類型但不同色的棋子"""
+
+    def scalar(self) -> str:
+        return "(opposite_center > 0)"
+
+    vector = scalar
+
+@dataclass(frozen=True)
+class AllOf(Condition):
+    """所有條件皆成立"""
+    conditions: Tuple[Condition, ...]
+
+    def __init__(self, *conditions: Condition):
+        object.__setattr__(self, 'conditions', conditions)
+
+    def scalar(self) -> str:
+        return "(" + " and ".join(condition.scalar() for condition in self.conditions) + ")"
+
+    def vector(self) -> str:
+        return "(" + " & ".join(condition.vector() for condition in self.conditions) + ")"
+
+@dataclass(frozen=True)
+class AnyOf(Condition):
+    """任一條件成立"""
+    conditions: Tuple[Condition, ...]
+
+    def __init__(self, *conditions: Condition):
+        object.__setattr__(self, 'conditions', conditions)
+
+    def scalar(self) -> str:
+        return "(" + " or ".join(condition.scalar() for condition in self.conditions) + ")"
+
+    def vector(self) -> str:
+        return "(" + " | ".join(condition.vector() for condition in self.conditions) + ")"
+
+@dataclass(frozen=True)
+class Not(Condition):
+    """條件不成立"""
+    condition: Condition
+
+    def scalar(self) -> str:
+        return f"(not {self.condition.scalar()})"
+
+    def vector(self) -> str:
+        return f"(~{self.condition.vector()})"
+
+@dataclass(frozen=True)
+class PatternRule:
+    """格局規則：名稱、條件與符合時的建議"""
+    label: str
+    condition: Condition
+    suggestion: Optional[str] = None
+
+RED, BLACK = Color.RED, Color.BLACK
+
+# 規則順序即 identify_patterns 的輸出順序與建議的排列順序
+PATTERN_RULES: List[PatternRule] = [
+    PatternRule("全紅格", RedCount(5),
+                "格局過於單一，建議多元化發展，接觸不同類型的人和事物，避免思維僵化"),
+    PatternRule("全黑格", RedCount(0),
+                "格局過於單一，建議多元化發展，接觸不同類型的人和事物，避免思維僵化"),
+    PatternRule("一枝獨秀格", RedCount(1, 4),
+                "雖然獨特出眾，但要注意與他人的協調合作，避免孤立無援"),
+    # 聲聲格：中間與四周顏色不同
+    PatternRule("聲聲格（外人看好）", SlotColors({1: BLACK, 2: RED, 3: RED, 4: RED, 5: RED}),
+                "外界對您評價良好，但要注意內在修養，避免表裡不一"),
+    PatternRule("聲聲格（外人看不好）", SlotColors({1: RED, 2: BLACK, 3: BLACK, 4: BLACK, 5: BLACK}),
+                "外界可能對您有誤解，建議多展現真實的自己，改善外在形象"),
+    # 眾星拱月格：中間與四周顏色相同
+    PatternRule("眾星拱月格", SameColor(1, 2, 3, 4, 5)),
+    PatternRule("十字天助格", AnyOf(SameColor(1, 2, 3), SameColor(1, 4, 5)),
+                "有天助之象，是發展的好時機，建議把握機會積極進取"),
+    PatternRule("勝利格", SameColor(2, 3, 5),
+                "具有勝利的潛質，建議保持信心，堅持努力，成功在望"),
+    PatternRule("雨傘格", SameColor(2, 3, 4),
+                "有長輩庇護，但也要培養獨立能力，避免過度依賴"),
+    PatternRule("桃花格（包包）", TypeCount(PieceType.CANNON, at_least=2),
+                "人際關係豐富，異性緣佳，但要注意感情專一，避免桃花劫"),
+    PatternRule("桃花格（包將）", AllOf(TypeCount(PieceType.CANNON, exactly=1), TypeCount(PieceType.GENERAL)),
+                "人際關係豐富，異性緣佳，但要注意感情專一，避免桃花劫"),
+    PatternRule("三人同心格", TypeCount(PieceType.SOLDIER, at_least=3)),
+    # 事業格：象與車馬同時出現
+    PatternRule("事業格", AllOf(TypeCount(PieceType.ELEPHANT),
+                              AnyOf(TypeCount(PieceType.CHARIOT), TypeCount(PieceType.HORSE))),
+                "適合專注事業發展，有成功的潛質，但要注意工作與生活的平衡"),
+    # 富貴格：將帥與士象同時出現
+    PatternRule("富貴格", AllOf(TypeCount(PieceType.GENERAL),
+                              AnyOf(TypeCount(PieceType.ADVISOR), TypeCount(PieceType.ELEPHANT))),
+                "有富貴之象，容易得到貴人相助，建議善用人際關係，回饋社會"),
+    # 困擾格：兩對好朋友（士仕、包炮、馬傌）
+    PatternRule("困擾格", PairTotal((PieceType.ADVISOR, PieceType.CANNON, PieceType.HORSE), 2),
+                "面臨選擇困難，建議冷靜分析利弊，必要時尋求專業建議"),
+    # 分離格：左右或上下兩側皆與中間不同色且彼此不同色
+    PatternRule("分離格（離婚格）", AnyOf(
+        AllOf(ColorsDiffer(1, 2), ColorsDiffer(1, 3), ColorsDiffer(2, 3)),
+        AllOf(ColorsDiffer(1, 4), ColorsDiffer(1, 5), ColorsDiffer(4, 5))),
+                "人際關係可能面臨考驗，建議加強溝通，化解誤會，維護重要關係"),
+    PatternRule("消耗格", DuplicateKind(),
+                "存在能量消耗，建議適度休息，避免過度勞累，注意身心平衡"),
+    # 好朋友格：中間與四周不同色的同類型棋子（將帥除外）
+    PatternRule("好朋友格", AllOf(Not(CenterType(PieceType.GENERAL)), CenterCounterpart()),
+                "人際關係良好，有互助的朋友，建議珍惜友誼，互相扶持"),
+]
+
+PATTERN_LABELS = [rule.label for rule in PATTERN_RULES]
+PATTERN_BITS = {label: 1 << index for index, label in enumerate(PATTERN_LABELS)}
+
+# --- 編譯 ---
+def _scalar_source(rules: List[PatternRule]) -> str:
+    lines = [
+        "def evaluate_patterns(code, features):",
+        f"    mask = features & {SLOT_MASK}",
+        f"    black_count = (features >> {BLACK_COUNT_OFFSET}) & 7",
+    ]
+    for piece_type in PieceType:
+        shift = TYPE_COUNT_OFFSET + COUNT_BITS * PIECE_TYPES.index(piece_type)
+        lines.append(f"    {TYPE_NAMES[piece_type]} = (features >> {shift}) & 7")
+    lines += [
+        f"    kind_pairs = (features & {KIND_PAIR_MASK}) != 0",
+        "    center_kind = code & 15",
+        "    center_type = center_kind >> 1",
+        f"    opposite_center = (features >> ({KIND_COUNT_OFFSET} + {COUNT_BITS} * (center_kind ^ 1))) & 7",
+        "    patterns = 0",
+    ]
+    for index, rule in enumerate(rules):
+        lines.append(f"    if {rule.condition.scalar()}:  # {rule.label}")
+        lines.append(f"        patterns |= {1 << index}")
+    lines.append("    return patterns")
+    return "\n".join(lines) + "\n"
+
+def _vector_source(rules: List[PatternRule]) -> str:
+    lines = ["def evaluate_patterns_batch(mask, black_count, kind_pairs, center_type, opposite_center, "
+             + ", ".join(TYPE_NAMES[piece_type] for piece_type in PieceType) + "):",
+             "    patterns = np.zeros(len(mask), dtype=np.uint32)"]
+    for index, rule in enumerate(rules):
+        lines.append(f"    patterns |= {rule.condition.vector()}.astype(np.uint32) << {index}  # {rule.label}")
+    lines.append("    return patterns")
+    return "\n".join(lines) + "\n"
+
+def _compile(source: str, name: str, namespace: Dict[str, Any]) -> Callable:
+    exec(compile(source, f"<pattern_rules:{name}>", 'exec'), namespace)
+    return namespace[name]
+
+PATTERN_EVALUATOR_SOURCE = _scalar_source(PATTERN_RULES)
+_evaluate_patterns = _compile(PATTERN_EVALUATOR_SOURCE, 'evaluate_patterns', {})
+
+def pattern_mask(code: int, features: int = None) -> int:
+    """格局遮罩：位元順序同 PATTERN_LABELS"""
+    if features is None:
+        features = spread_features(code)
+    return _evaluate_patterns(code, features)
+
+@lru_cache(maxsize=1)
+def compile_batch_evaluator(np_module) -> Callable:
+    """編譯 NumPy 批次判斷函式（參數為各項計數陣列）"""
+    return _compile(_vector_source(PATTERN_RULES), 'evaluate_patterns_batch', {'np': np_module})
+
+def decode_patterns(mask: int) -> List[str]:
+    """將格局遮罩還原為格局名稱列表"""
+    return [label for index, label in enumerate(PATTERN_LABELS) if mask >> index & 1]
+
+def patterns_to_mask(patterns: List[str]) -> int:
+    """將格局名稱列表轉為遮罩（忽略未知名稱）"""
+    mask = 0
+    for label in patterns:
+        mask |= PATTERN_BITS.get(label, 0)
+    return mask
+
+@lru_cache(maxsize=None)
+def pattern_suggestions(mask: int) -> Tuple[str, ...]:
+    """格局遮罩對應的建議（依規則順序，重複者只保留一次）"""
+    suggestions: List[str] = []
+    for index, rule in enumerate(PATTERN_RULES):
+        if mask >> index & 1 and rule.suggestion and rule.suggestion not in suggestions:
+            suggestions.append(rule.suggestion)
+    return tuple(suggestions)
@@ -0,0 +1,138 @@
+"""
+啟動預熱與就緒檢查
+每個程序只執行一次：在背景執行緒匯入解卦引擎、載入預計算表、編譯格局規則並填入棋盤片段快取，
+讓第一個畫面只需載入棋盤相關模組；完成後標記為就緒
+
+就緒檢查：
+- 設定 XIANGQI_READY_PORT 時，在本機該埠提供 /ready（就緒為200，否則503）與 /live
+- python prewarm.py：同步執行預熱並檢查預計算表，可用於部署流程（未就緒時以狀態碼1結束）
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+READY_PORT = os.environ.get('XIANGQI_READY_PORT')
+
+def _load_engine():
+    import divination_engine  # noqa: F401  匯入引擎、格局規則與特徵表
+    import divination_cache  # noqa: F401
+    import divination_whatif  # noqa: F401
+
+def _load_outcome_table():
+    from divination_table import get_outcome_table
+    get_outcome_table()
+
+def _warm_cell_fragments():
+    from board_render import cell_fragments
+    from models.xiangqi import PIECE_KINDS
+    for kind in [None, *range(len(PIECE_KINDS))]:
+        for selected in (False, True):
+            cell_fragments(kind, selected)
+
+def _open_reading_store():
+    from reading_store import get_reading_store
+    get_reading_store()
+
+# 預熱步驟（依序執行）
+PREWARM_STEPS: List[Tuple[str, Callable[[], None]]] = [
+    ('engine', _load_engine),
+    ('outcome_table', _load_outcome_table),
+    ('cell_fragments', _warm_cell_fragments),
+    ('reading_store', _open_reading_store),
+]
+
+class Prewarm:
+    """預熱狀態"""
+
+    def __init__(self, steps: List[Tuple[str, Callable[[], None]]] = PREWARM_STEPS):
+        self.steps = steps
+        self.status = 'pending'   # pending / running / ready / failed
+        self.timings: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._done = threading.Event()
+
+    @property
+    def ready(self) -> bool:
+        return self.status == 'ready'
+
+    def run(self):
+        """依序執行所有步驟；單一步驟失敗不影響其他步驟，但整體標記為失敗"""
+        self.status = 'running'
+        self.started_at = time.time()
+        for name, step in self.steps:
+            started = time.perf_counter()
+            try:
+                step()
+            except Exception as exc:
+                self.errors[name] = f"{type(exc).__name__}: {exc}"
+            self.timings[name] = time.perf_counter() - started
+        self.finished_at = time.time()
+        self.status = 'failed' if self.errors else 'ready'
+        self._done.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待預熱完成，回傳是否就緒"""
+        self._done.wait(timeout)
+        return self.ready
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'status': self.status,
+            'timings': {name: round(seconds, 4) for name, seconds in self.timings.items()},
+            'errors': self.errors,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+_prewarm: Optional[Prewarm] = None
+_prewarm_lock = threading.Lock()
+
+def start_prewarm() -> Prewarm:
+    """在背景執行緒開始預熱（同一程序只會執行一次），並依設定啟動就緒檢查端點"""
+    global _prewarm
+    with _prewarm_lock:
+        if _prewarm is None:
+            _prewarm = Prewarm()
+            threading.Thread(target=_prewarm.run, name='prewarm', daemon=True).start()
+            if READY_PORT:
+                start_readiness_server(int(READY_PORT))
+    return _prewarm
+
+def readiness() -> Dict[str, Any]:
+    """目前程序的預熱狀態"""
+    if _prewarm is None:
+        return {'status': 'pending'}
+    return _prewarm.to_dict()
+
+def _ready_response() -> Tuple[int, str]:
+    state = readiness()
+    return (200 if state['status'] == 'ready' else 503), json.dumps(state, ensure_ascii=False)
+
+def start_readiness_server(port: int, host: str = '127.0.0.1'):
+    """在本機提供 /ready 與 /live"""
+    from metrics import serve_text
+    return serve_text(port, {'/ready': _ready_response, '/live': lambda: (200, 'ok')}, host)
+
+def main():
+    parser = argparse.ArgumentParser(description="預熱並檢查是否就緒")
+    parser.add_argument('--require-table', action='store_true', help="預計算表不存在或過期時視為未就緒")
+    args = parser.parse_args()
+
+    prewarm = Prewarm()
+    prewarm.run()
+    report = prewarm.to_dict()
+    from divination_table import get_outcome_table
+    report['outcome_table'] = get_outcome_table() is not None
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if not prewarm.ready or (args.require_table and not report['outcome_table']):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
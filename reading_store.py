@@ -0,0 +1,310 @@
+"""
+卜卦紀錄儲存
+以 SQLite（WAL 模式）保存卜卦紀錄；寫入先放入佇列，由背景執行緒批次寫入，
+呼叫端不需等待磁碟 I/O。歷史紀錄以 (created_at, id) 為鍵集分頁查詢
+
+每批寫入時於同一交易中累加彙總計數（每小時／每日的格局、三才缺失與五行失衡次數），
+統計查詢只讀取彙總表，耗時與紀錄總數無關
+
+資料表 reading.user_id 參照 models/user.py 的 user(id)；
+user 資料表不存在時以相同欄位建立，與 Flask-SQLAlchemy 的 db.create_all 相容
+"""
+
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from models.reading import Reading
+from packed_spread import WU_XINGS, decode_missing_talents
+from pattern_rules import decode_patterns
+from spread_features import features_for_code
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+READINGS_DB_PATH = os.environ.get('XIANGQI_READINGS_DB', os.path.join(BASE_DIR, 'readings.db'))
+
+BATCH_SIZE = 256        # 每次交易最多寫入的筆數
+FLUSH_INTERVAL = 0.5    # 佇列未滿一批時，最多等待的秒數
+MAX_PENDING = 100_000   # 佇列上限；超過時捨棄新紀錄而不阻塞呼叫端
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS user (
+    id INTEGER PRIMARY KEY,
+    username VARCHAR(80) NOT NULL UNIQUE,
+    email VARCHAR(120) NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS reading (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER REFERENCES user(id),
+    board_token TEXT NOT NULL,
+    spread_code INTEGER NOT NULL,
+    pattern_mask INTEGER NOT NULL,
+    balance_score INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_reading_user_time ON reading (user_id, created_at, id);
+CREATE INDEX IF NOT EXISTS ix_reading_time ON reading (created_at);
+CREATE TABLE IF NOT EXISTS reading_rollup (
+    granularity INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    metric TEXT NOT NULL,
+    label TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (granularity, bucket, metric, label)
+) WITHOUT ROWID;
+"""
+
+# --- 彙總計數 ---
+HOUR = 3600
+DAY = 86400
+ROLLUP_GRANULARITIES = (HOUR, DAY)  # 彙總的時間區間長度（秒，UTC 對齊）
+
+METRIC_READINGS = 'readings'  # 紀錄筆數（label 為空字串）
+METRIC_PATTERN = 'pattern'    # 格局
+METRIC_TALENT = 'talent'      # 三才缺失
+METRIC_WU_XING = 'wu_xing'    # 五行過多／缺失
+
+ROLLUP_UPSERT_SQL = (
+    "INSERT INTO reading_rollup (granularity, bucket, metric, label, count) VALUES (?, ?, ?, ?, ?) "
+    "ON CONFLICT (granularity, bucket, metric, label) DO UPDATE SET count = count + excluded.count"
+)
+
+INSERT_SQL = (
+    "INSERT INTO reading (user_id, board_token, spread_code, pattern_mask, balance_score, created_at) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+SELECT_COLUMNS = "id, user_id, board_token, spread_code, pattern_mask, balance_score, created_at"
+
+# 分頁游標：上一頁最後一筆的 (created_at, id)
+Cursor = Tuple[float, int]
+
+WU_XING_IMBALANCE_LABELS = [f"{wu_xing.value}過多" for wu_xing in WU_XINGS] + [f"缺{wu_xing.value}" for wu_xing in WU_XINGS]
+
+def wu_xing_imbalances(spread_code: int) -> List[str]:
+    """五行失衡標籤：同一五行3隻以上為「X過多」，未出現為「缺X」"""
+    counts = features_for_code(spread_code).wu_xing_counts
+    labels = [f"{wu_xing.value}過多" for wu_xing, count in zip(WU_XINGS, counts) if count >= 3]
+    labels.extend(f"缺{wu_xing.value}" for wu_xing, count in zip(WU_XINGS, counts) if not count)
+    return labels
+
+def rollup_labels(spread_code: int, pattern_mask: int) -> List[Tuple[str, str]]:
+    """一筆紀錄計入的 (metric, label)"""
+    labels = [(METRIC_READINGS, '')]
+    labels.extend((METRIC_PATTERN, label) for label in decode_patterns(pattern_mask))
+    missing = features_for_code(spread_code).missing_talents
+    labels.extend((METRIC_TALENT, label) for label in decode_missing_talents(missing))
+    labels.extend((METRIC_WU_XING, label) for label in wu_xing_imbalances(spread_code))
+    return labels
+
+def rollup_counts(readings: Iterable[Tuple[float, int, int]]) -> Counter:
+    """將 (created_at, spread_code, pattern_mask) 彙總為 {(granularity, bucket, metric, label): 次數}"""
+    counts: Counter = Counter()
+    for created_at, spread_code, pattern_mask in readings:
+        labels = rollup_labels(spread_code, pattern_mask)
+        for granularity in ROLLUP_GRANULARITIES:
+            bucket = int(created_at // granularity) * granularity
+            for metric, label in labels:
+                counts[granularity, bucket, metric, label] += 1
+    return counts
+
+def _row_to_reading(row: tuple) -> Reading:
+    reading_id, user_id, board_token, spread_code, pattern_mask, balance_score, created_at = row
+    return Reading(board_token, spread_code, pattern_mask, balance_score, created_at, user_id, reading_id)
+
+class ReadingStore:
+    """卜卦紀錄儲存（執行緒安全）"""
+
+    def __init__(self, path: str = READINGS_DB_PATH, batch_size: int = BATCH_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL, max_pending: int = MAX_PENDING):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+        self._queue: 'queue.Queue[Optional[Reading]]' = queue.Queue(maxsize=max_pending)
+        self._local = threading.local()
+        self._closed = False
+
+        connection = self._connect()
+        connection.executescript(SCHEMA)
+        has_readings = connection.execute("SELECT 1 FROM reading LIMIT 1").fetchone()
+        has_rollups = connection.execute("SELECT 1 FROM reading_rollup LIMIT 1").fetchone()
+        if has_readings and not has_rollups:
+            # 舊資料庫沒有彙總表：一次性由既有紀錄建立
+            self._rebuild_rollups(connection)
+        connection.close()
+        self._writer = threading.Thread(target=self._write_loop, name='reading-writer', daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA foreign_keys=ON")
+        return connection
+
+    def _reader(self) -> sqlite3.Connection:
+        # 每個執行緒使用自己的讀取連線；WAL 模式下讀取不會被寫入阻塞
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+
+    # --- 寫入 ---
+    def record(self, board_token: str, spread_code: int, pattern_mask: int, balance_score: int,
+               user_id: Optional[int] = None, created_at: Optional[float] = None) -> bool:
+        """加入一筆紀錄到寫入佇列（不阻塞）；佇列已滿或已關閉時捨棄並回傳 False"""
+        reading = Reading(board_token, spread_code, pattern_mask, balance_score,
+                          time.time() if created_at is None else created_at, user_id)
+        if self._closed:
+            self.dropped += 1
+            return False
+        try:
+            self._queue.put_nowait(reading)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def _write_loop(self):
+        connection = self._connect()
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            batch: List[Reading] = []
+            markers = 1
+            if item is None:
+                stopping = True
+            else:
+                batch.append(item)
+            deadline = time.monotonic() + self.flush_interval
+            while not stopping and len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                markers += 1
+                if item is None:
+                    stopping = True
+                else:
+                    batch.append(item)
+            if batch:
+                self._write_batch(connection, batch)
+            for _ in range(markers):
+                self._queue.task_done()
+        connection.close()
+
+    def _write_batch(self, connection: sqlite3.Connection, batch: List[Reading]):
+        rows = [(r.user_id, r.board_token, r.spread_code, r.pattern_mask, r.balance_score, r.created_at)
+                for r in batch]
+        try:
+            with connection:
+                connection.executemany(INSERT_SQL, rows)
+                self._add_rollups(connection, batch)
+            self.written += len(rows)
+        except sqlite3.Error:
+            # 寫入失敗（如 user_id 不存在）時逐筆重試，只捨棄有問題的紀錄
+            for reading, row in zip(batch, rows):
+                try:
+                    with connection:
+                        connection.execute(INSERT_SQL, row)
+                        self._add_rollups(connection, [reading])
+                    self.written += 1
+                except sqlite3.Error:
+                    self.dropped += 1
+
+    @staticmethod
+    def _add_rollups(connection: sqlite3.Connection, batch: List[Reading]):
+        counts = rollup_counts((r.created_at, r.spread_code, r.pattern_mask) for r in batch)
+        connection.executemany(ROLLUP_UPSERT_SQL, [key + (count,) for key, count in counts.items()])
+
+    @staticmethod
+    def _rebuild_rollups(connection: sqlite3.Connection, chunk_size: int = 10_000):
+        with connection:
+            connection.execute("DELETE FROM reading_rollup")
+            cursor = connection.execute("SELECT created_at, spread_code, pattern_mask FROM reading")
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                counts = rollup_counts(rows)
+                connection.executemany(ROLLUP_UPSERT_SQL, [key + (count,) for key, count in counts.items()])
+
+    def flush(self):
+        """等待佇列中的紀錄全部寫入"""
+        self._queue.join()
+
+    def close(self):
+        """寫入剩餘紀錄並停止背景執行緒"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+
+    # --- 查詢 ---
+    def history(self, user_id: Optional[int], limit: int = 20,
+                before: Optional[Cursor] = None) -> Tuple[List[Reading], Optional[Cursor]]:
+        """依時間由新到舊查詢用戶的紀錄（user_id 為 None 表示匿名紀錄）
+
+        回傳 (紀錄, 下一頁游標)；沒有下一頁時游標為 None
+        """
+        user_clause = "user_id IS ?" if user_id is None else "user_id = ?"
+        sql = f"SELECT {SELECT_COLUMNS} FROM reading WHERE {user_clause}"
+        params: list = [user_id]
+        if before is not None:
+            sql += " AND (created_at, id) < (?, ?)"
+            params.extend(before)
+        sql += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        rows = self._reader().execute(sql, params).fetchall()
+        readings = [_row_to_reading(row) for row in rows[:limit]]
+        cursor = (readings[-1].created_at, readings[-1].id) if len(rows) > limit else None
+        return readings, cursor
+
+    def count(self, user_id: Optional[int] = None) -> int:
+        """紀錄筆數；未指定用戶時為全部紀錄"""
+        if user_id is None:
+            return self._reader().execute("SELECT COUNT(*) FROM reading").fetchone()[0]
+        return self._reader().execute("SELECT COUNT(*) FROM reading WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+    def rollup_totals(self, since: float, granularity: int = HOUR) -> Dict[str, Dict[str, int]]:
+        """自 since 所在區間起的彙總次數：{metric: {label: 次數}}"""
+        start = int(since // granularity) * granularity
+        rows = self._reader().execute(
+            "SELECT metric, label, SUM(count) FROM reading_rollup "
+            "WHERE granularity = ? AND bucket >= ? GROUP BY metric, label",
+            (granularity, start)
+        ).fetchall()
+        totals: Dict[str, Dict[str, int]] = {}
+        for metric, label, count in rows:
+            totals.setdefault(metric, {})[label] = count
+        return totals
+
+    def rollup_series(self, metric: str, since: float, granularity: int = HOUR) -> List[Tuple[int, str, int]]:
+        """自 since 所在區間起，指定 metric 各區間的次數：[(區間起點, label, 次數)]"""
+        start = int(since // granularity) * granularity
+        return self._reader().execute(
+            "SELECT bucket, label, count FROM reading_rollup "
+            "WHERE granularity = ? AND bucket >= ? AND metric = ? ORDER BY bucket",
+            (granularity, start, metric)
+        ).fetchall()
+
+_store: Optional[ReadingStore] = None
+_store_lock = threading.Lock()
+
+def get_reading_store() -> ReadingStore:
+    """取得程序共用的紀錄儲存（首次呼叫時建立，程序結束時寫入剩餘紀錄）"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ReadingStore()
+                atexit.register(_store.close)
+    return _store
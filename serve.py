@@ -0,0 +1,24 @@
+"""
+啟動 Streamlit 伺服器
+streamlit run app.py 要等第一個工作階段執行 app.py 時才會開始預熱；
+本程式在同一程序中先開始預熱（並依 XIANGQI_READY_PORT 啟動就緒檢查端點），再啟動伺服器，
+部署時的就緒探測在任何使用者連線前即可取得回應。app.py 的 prewarm_process 會沿用同一份預熱狀態
+
+用法：python serve.py [streamlit run 的其他參數，例如 --server.port 8501 --server.headless true]
+"""
+
+import os
+import sys
+
+from prewarm import start_prewarm
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+
+def main():
+    start_prewarm()
+    from streamlit.web import cli
+    sys.argv = ['streamlit', 'run', APP_PATH, *sys.argv[1:]]
+    sys.exit(cli.main())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+卦象特徵擷取
+每次解卦只擷取一次特徵（顏色、類型、五行計數與三才／格局遮罩），
+存成不可變的特徵紀錄，供各分析函式共用
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Tuple
+
+from models.xiangqi import ChessPiece, PieceType, WuXing, SPREAD_SIZE, spread_code
+from packed_spread import (
+    PIECE_TYPES, WU_XINGS, friend_pair_count, has_consumption, missing_talent_mask,
+    red_count, spread_features, type_count, wu_xing_count
+)
+from pattern_rules import pattern_mask
+
+FEATURE_CACHE_SIZE = 4096
+
+@dataclass(frozen=True)
+class SpreadFeatures:
+    """單一卦象的特徵紀錄"""
+    __slots__ = ('code', 'word', 'red_count', 'type_counts', 'wu_xing_counts',
+                 'missing_talents', 'patterns', 'friend_pairs', 'consumption')
+
+    code: int                       # 排列編碼
+    word: int                       # 特徵字組（見 packed_spread）
+    red_count: int
+    type_counts: Tuple[int, ...]    # 順序同 PIECE_TYPES
+    wu_xing_counts: Tuple[int, ...] # 順序同 WU_XINGS
+    missing_talents: int            # 三才缺失遮罩
+    patterns: int                   # 格局遮罩
+    friend_pairs: int
+    consumption: bool
+
+    @property
+    def black_count(self) -> int:
+        return SPREAD_SIZE - self.red_count
+
+    def type_count(self, piece_type: PieceType) -> int:
+        """指定類型的數量"""
+        return self.type_counts[PIECE_TYPES.index(piece_type)]
+
+    def wu_xing_count(self, wu_xing: WuXing) -> int:
+        """指定五行的數量"""
+        return self.wu_xing_counts[WU_XINGS.index(wu_xing)]
+
+@lru_cache(maxsize=FEATURE_CACHE_SIZE)
+def features_for_code(code: int) -> SpreadFeatures:
+    """由排列編碼擷取特徵紀錄"""
+    word = spread_features(code)
+    return SpreadFeatures(
+        code=code,
+        word=word,
+        red_count=red_count(word),
+        type_counts=tuple(type_count(word, piece_type) for piece_type in PIECE_TYPES),
+        wu_xing_counts=tuple(wu_xing_count(word, wu_xing) for wu_xing in WU_XINGS),
+        missing_talents=missing_talent_mask(word),
+        patterns=pattern_mask(code, word),
+        friend_pairs=friend_pair_count(word),
+        consumption=has_consumption(word),
+    )
+
+def extract_features(pieces: List[ChessPiece]) -> SpreadFeatures:
+    """擷取五隻棋子的特徵紀錄；排列編碼只能表示剛好5隻，數量不符時拋出 ValueError"""
+    if len(pieces) != SPREAD_SIZE:
+        raise ValueError(f"卦象必須剛好有 {SPREAD_SIZE} 隻棋子")
+    return features_for_code(spread_code(pieces))
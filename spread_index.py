@@ -0,0 +1,192 @@
+"""
+格局反向索引
+將每個格局、三才缺失與陰陽平衡條件對應到符合的排列集合（位元集合），程序內只建立一次；
+查詢以位元 AND / ANDNOT 組合，回傳排列數、精確機率與範例排列。
+
+排列依取法數權重由大到小分組，每組在位元集合中佔連續且對齊位元組的區段，
+加權計數只需各組的 popcount 乘上該組權重
+
+用法：
+    python spread_index.py 勝利格 富貴格 --not 消耗格
+    python spread_index.py 缺地格 --examples 5
+"""
+
+import argparse
+import json
+from dataclasses import dataclass
+from fractions import Fraction
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List
+
+import numpy as np
+
+from models.xiangqi import ChessPiece, piece_for_kind, spread_kinds
+from packed_spread import TALENT_LABELS
+from pattern_rules import PATTERN_BITS, PATTERN_LABELS
+from divination_batch import codes_from_kinds
+from divination_probability import TOTAL_DRAWS, legal_results, legal_spreads
+
+MISSING_TALENT_TERMS = [f"缺{label}" for label in TALENT_LABELS]
+BALANCE_TERM = "陰陽平衡"
+# 可查詢的條件名稱
+INDEX_TERMS = PATTERN_LABELS + MISSING_TALENT_TERMS + [BALANCE_TERM]
+
+# 每個位元組的 1 位元數
+_POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+@dataclass(frozen=True)
+class QueryResult:
+    """查詢結果"""
+    index: 'SpreadIndex'
+    bits: np.ndarray  # 符合條件的位元集合（packbits 格式）
+    count: int        # 符合的有序排列數
+    draws: int        # 依序抽出這些排列的取法數（32隻中有序取5隻）
+
+    @property
+    def probability(self) -> Fraction:
+        """依序抽出符合條件排列的精確機率"""
+        return Fraction(self.draws, TOTAL_DRAWS)
+
+    @property
+    def share(self) -> float:
+        """符合條件的排列占所有合法排列的比例（不加權）"""
+        return self.count / len(self.index)
+
+    def codes(self, limit: int = None) -> List[int]:
+        """符合條件的排列編碼（依出現機率由高到低）"""
+        positions = np.flatnonzero(np.unpackbits(self.bits))
+        if limit is not None:
+            positions = positions[:limit]
+        return self.index.codes[positions].tolist()
+
+    def examples(self, limit: int = 10) -> List[List[ChessPiece]]:
+        """範例排列（依中、左、右、上、下順序的棋子）"""
+        return [[piece_for_kind(kind) for kind in spread_kinds(code)] for code in self.codes(limit)]
+
+    def to_dict(self, examples: int = 0) -> Dict[str, Any]:
+        payload = {
+            'count': self.count,
+            'share': self.share,
+            'probability': float(self.probability),
+            'fraction': str(self.probability),
+        }
+        if examples:
+            payload['examples'] = [",".join(piece.display_name for piece in pieces)
+                                   for pieces in self.examples(examples)]
+        return payload
+
+class SpreadIndex:
+    """條件 -> 排列位元集合的反向索引"""
+
+    def __init__(self, codes: np.ndarray, class_weights: np.ndarray, class_starts: np.ndarray,
+                 universe: np.ndarray, bitsets: Dict[str, np.ndarray]):
+        self.codes = codes                  # 位元位置 -> 排列編碼（對齊用的空位不會出現在任何集合中）
+        self.class_weights = class_weights  # 各權重組的取法數
+        self.class_starts = class_starts    # 各權重組在位元集合中的起始位元組
+        self.universe = universe            # 所有合法排列
+        self.bitsets = bitsets
+        self._size = self.count(self.universe)
+
+    def __len__(self) -> int:
+        return self._size
+
+    @classmethod
+    def build(cls) -> 'SpreadIndex':
+        """以批次引擎計算所有合法排列的結果後建立索引"""
+        kinds, weights = legal_spreads()
+        result = legal_results()
+        spread_codes = codes_from_kinds(kinds)
+
+        # 依權重由大到小排序，相同權重依排列編碼排序
+        order = np.lexsort((spread_codes, -weights))
+        class_weights, class_sizes = np.unique(-weights[order], return_counts=True)
+        class_weights = -class_weights
+        class_bytes = (class_sizes + 7) // 8
+        class_starts = np.concatenate(([0], np.cumsum(class_bytes)[:-1]))
+        class_offsets = np.repeat(class_starts * 8, class_sizes)
+        ranks = np.arange(len(order)) - np.repeat(np.cumsum(class_sizes) - class_sizes, class_sizes)
+        positions = class_offsets + ranks  # 排序後第 i 個排列的位元位置
+
+        size = int(class_bytes.sum()) * 8
+        codes = np.zeros(size, dtype=np.uint32)
+        codes[positions] = spread_codes[order]
+
+        def bitset(condition: np.ndarray) -> np.ndarray:
+            flags = np.zeros(size, dtype=bool)
+            flags[positions] = condition[order]
+            return np.packbits(flags)
+
+        conditions = {}
+        for label in PATTERN_LABELS:
+            conditions[label] = (result.patterns & PATTERN_BITS[label]) != 0
+        for bit, term in enumerate(MISSING_TALENT_TERMS):
+            conditions[term] = (result.missing_talents >> bit) & 1 == 1
+        conditions[BALANCE_TERM] = result.yin_yang_balance
+        return cls(codes, class_weights, class_starts, bitset(np.ones(len(order), dtype=bool)),
+                   {term: bitset(condition) for term, condition in conditions.items()})
+
+    def bitset(self, term: str) -> np.ndarray:
+        """條件對應的位元集合，名稱不正確時拋出 ValueError"""
+        if term not in self.bitsets:
+            raise ValueError(f"未知的條件：{term!r}（可用：{'、'.join(INDEX_TERMS)}）")
+        return self.bitsets[term]
+
+    @staticmethod
+    def count(bits: np.ndarray) -> int:
+        return int(_POPCOUNT[bits].sum(dtype=np.int64))
+
+    def weighted_count(self, bits: np.ndarray) -> int:
+        """位元集合的取法數總和：各權重組的 popcount 乘上權重"""
+        class_counts = np.add.reduceat(_POPCOUNT[bits].astype(np.int64), self.class_starts)
+        return int((class_counts * self.class_weights).sum())
+
+    def query(self, all_of: Iterable[str] = (), none_of: Iterable[str] = (),
+              any_of: Iterable[str] = ()) -> QueryResult:
+        """同時符合 all_of、不符合任何 none_of，且（若指定）至少符合一個 any_of 的排列"""
+        bits = self.universe.copy()
+        for term in all_of:
+            bits &= self.bitset(term)
+        for term in none_of:
+            bits &= ~self.bitset(term)
+        any_terms = list(any_of)
+        if any_terms:
+            union = np.zeros_like(bits)
+            for term in any_terms:
+                union |= self.bitset(term)
+            bits &= union
+        return QueryResult(self, bits, self.count(bits), self.weighted_count(bits))
+
+@lru_cache(maxsize=1)
+def get_spread_index() -> SpreadIndex:
+    """取得反向索引（每個程序只建立一次）"""
+    return SpreadIndex.build()
+
+def query_spreads(all_of: Iterable[str] = (), none_of: Iterable[str] = (),
+                  any_of: Iterable[str] = ()) -> QueryResult:
+    """查詢符合格局／三才條件的排列"""
+    return get_spread_index().query(all_of, none_of, any_of)
+
+def main():
+    parser = argparse.ArgumentParser(description="查詢符合格局與三才條件的排列")
+    parser.add_argument('terms', nargs='*', help=f"必須同時符合的條件（{'、'.join(INDEX_TERMS)}）")
+    parser.add_argument('--not', dest='excluded', action='append', default=[], help="不可符合的條件（可重複）")
+    parser.add_argument('--any', dest='any_of', action='append', default=[], help="至少符合其一的條件（可重複）")
+    parser.add_argument('--examples', type=int, default=10, help="列出的範例排列數")
+    parser.add_argument('--json', action='store_true', help="以 JSON 輸出")
+    args = parser.parse_args()
+
+    try:
+        result = query_spreads(args.terms, args.excluded, args.any_of)
+    except ValueError as exc:
+        parser.error(str(exc))
+    if args.json:
+        print(json.dumps(result.to_dict(args.examples), ensure_ascii=False, indent=2))
+        return
+    probability = result.probability
+    print(f"排列數：{result.count}（{result.share:.4%}）")
+    print(f"機率：{float(probability):.6%}\t({probability.numerator}/{probability.denominator})")
+    for pieces in result.examples(args.examples):
+        print("  " + ",".join(piece.display_name for piece in pieces))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+左右對稱的標準排列
+左方與右方（位置2、3）互換不影響陰陽平衡、三才、格局、付出與收穫、健康分析與建議，
+只有呈現狀態與互動關係中的左右描述需要對調（見 divination_engine.mirror_analysis）。
+每個排列對應到編碼較小的一側作為標準排列，快取與預計算表只需存放約一半的排列
+"""
+
+from typing import List, Tuple
+
+from models.xiangqi import ChessPiece, SLOT_BITS
+
+LEFT_SLOT = 1
+RIGHT_SLOT = 2
+MIRROR_SLOTS = (0, RIGHT_SLOT, LEFT_SLOT, 3, 4)  # 左右互換後各位置的來源位置
+
+_LEFT_SHIFT = LEFT_SLOT * SLOT_BITS
+_RIGHT_SHIFT = RIGHT_SLOT * SLOT_BITS
+_SIDE_MASK = (0xF << _LEFT_SHIFT) | (0xF << _RIGHT_SHIFT)
+
+def mirror_code(code: int) -> int:
+    """左右互換後的排列編碼"""
+    left = (code >> _LEFT_SHIFT) & 0xF
+    right = (code >> _RIGHT_SHIFT) & 0xF
+    return (code & ~_SIDE_MASK) | (right << _LEFT_SHIFT) | (left << _RIGHT_SHIFT)
+
+def canonical_code(code: int) -> Tuple[int, bool]:
+    """標準排列編碼與是否需要左右互換才能還原為原排列"""
+    mirrored = mirror_code(code)
+    if mirrored < code:
+        return mirrored, True
+    return code, False
+
+def is_canonical(code: int) -> bool:
+    """是否為標準排列"""
+    return code <= mirror_code(code)
+
+def mirror_pieces(pieces: List[ChessPiece]) -> List[ChessPiece]:
+    """左右互換後的五隻棋子"""
+    return [pieces[source] for source in MIRROR_SLOTS]